@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+"""
+Benchmark the stages of the core documentation build.
+
+Each Makefile stage used by 'make coredocs' is run several times against the
+ansible-core sources cloned into this tree, recording the wall time, CPU time
+and peak RSS of every run. Results can be compared against a baseline to catch
+stages that got slower.
+
+Stages that need network access are only run when asked for with --stage, so
+the default run works offline.
+"""
+
+from __future__ import annotations
+
+import argparse
+import dataclasses
+import json
+import os
+import pathlib
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent.parent
+DOCSITE = ROOT / "docs" / "docsite"
+BUILD_DIR = DOCSITE / "_build"
+RELEASE_FILE = ROOT / "lib" / "ansible" / "release.py"
+
+"""Makefile stages to benchmark, in the order the docs build runs them"""
+STAGES: dict[str, tuple[str, ...]] = {
+    "collections_meta": ("collections_meta",),
+    "config": ("config",),
+    "cli": ("cli",),
+    "keywords": ("keywords",),
+    "core_plugins": ("core_plugins",),
+    "html": ("-f", "Makefile.sphinx", "html", "DOCS_VARIANTS=-t core"),
+}
+
+"""Stages that download data, antsibull-docs fetches ansible-core metadata from Galaxy"""
+NETWORK_STAGES = ("core_plugins",)
+
+"""Metrics compared against the baseline"""
+METRICS = ("wall_time", "cpu_time", "max_rss")
+
+
+@dataclasses.dataclass()
+class Args:
+    stages: list[str]
+    iterations: int
+    threshold: float
+    output: pathlib.Path | None
+    baseline: pathlib.Path | None
+    python: str
+
+
+@dataclasses.dataclass()
+class Sample:
+    wall_time: float
+    cpu_time: float
+    max_rss: int
+
+
+def parse_args(args: list[str] | None = None) -> Args:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--stage",
+        dest="stages",
+        action="append",
+        choices=tuple(STAGES),
+        help="Stage to benchmark. May be given more than once."
+        " Defaults to all stages that work offline,"
+        f" which excludes {', '.join(NETWORK_STAGES)}.",
+    )
+    parser.add_argument(
+        "--iterations",
+        type=int,
+        default=3,
+        help="Number of times to run each stage. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=20.0,
+        help="Percentage by which the median of a metric may exceed the"
+        " baseline before it counts as a regression. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--output",
+        type=pathlib.Path,
+        help="Write the results as JSON to this file."
+        " The file can be used as a --baseline for later runs.",
+    )
+    parser.add_argument(
+        "--baseline",
+        type=pathlib.Path,
+        help="Compare the results against a results file from an earlier run"
+        " and fail if any stage regressed past --threshold.",
+    )
+    parser.add_argument(
+        "--python",
+        default=sys.executable,
+        help="Python interpreter for the Makefile's PYTHON variable, which only"
+        " runs version_helper.py. The generators run with the first python on"
+        " PATH, so activate the environment to benchmark. Default: %(default)s",
+    )
+    parsed = parser.parse_args(args)
+    if parsed.iterations < 1:
+        parser.error("--iterations must be at least 1")
+    parsed.stages = parsed.stages or [
+        stage for stage in STAGES if stage not in NETWORK_STAGES
+    ]
+    return Args(**vars(parsed))
+
+
+def core_version() -> str:
+    """
+    Read the version of the cloned ansible-core sources without importing them
+    """
+    match = re.search(
+        r"^__version__ = ['\"]([^'\"]+)['\"]", RELEASE_FILE.read_text(), re.MULTILINE
+    )
+    if not match:
+        raise RuntimeError(f"Could not find __version__ in {RELEASE_FILE}")
+    return match.group(1)
+
+
+def run_stage(stage: str, python: str) -> Sample:
+    """
+    Run a single Makefile stage and measure it.
+    CPU time and peak RSS cover make and every process it waited for.
+    """
+    # Makefile.sphinx expects CPUS from docs/docsite/Makefile, which sets it to the number of CPUs
+    cpus = f"CPUS={os.cpu_count() or 1}"
+    cmd = ["make", "-C", str(DOCSITE), f"PYTHON={python}", cpus, *STAGES[stage]]
+    start = time.perf_counter()
+    with subprocess.Popen(
+        cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    ) as process:
+        assert process.stderr is not None
+        stderr = process.stderr.read()
+        _pid, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+    wall_time = time.perf_counter() - start
+
+    if process.returncode:
+        sys.stderr.buffer.write(stderr)
+        raise subprocess.CalledProcessError(process.returncode, cmd)
+
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    max_rss = usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+    return Sample(wall_time, usage.ru_utime + usage.ru_stime, max_rss)
+
+
+def summarize(samples: list[Sample]) -> dict[str, float]:
+    return {
+        metric: statistics.median(getattr(sample, metric) for sample in samples)
+        for metric in METRICS
+    }
+
+
+def compare(
+    results: dict[str, dict], baseline: dict[str, dict], threshold: float
+) -> list[str]:
+    """
+    Return a message for every stage metric that regressed past the threshold
+    """
+    regressions: list[str] = []
+    for stage, result in results.items():
+        if stage not in baseline:
+            continue
+        for metric in METRICS:
+            old = baseline[stage]["median"][metric]
+            new = result["median"][metric]
+            if old and new > old * (1 + threshold / 100):
+                regressions.append(
+                    f"{stage}: {metric} regressed from {old:.2f} to {new:.2f}"
+                    f" (+{(new / old - 1) * 100:.1f}%)"
+                )
+    return regressions
+
+
+def main(args: Args) -> None:
+    if not RELEASE_FILE.is_file():
+        sys.exit("ansible-core sources are missing. Run 'nox -e clone-core' first.")
+
+    # The html stage needs the core index symlinks in place
+    subprocess.run(
+        ["make", "-C", str(DOCSITE), f"PYTHON={args.python}", "core_structure"],
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+
+    results: dict[str, dict] = {}
+    for stage in args.stages:
+        samples: list[Sample] = []
+        for iteration in range(args.iterations):
+            if stage == "html" and BUILD_DIR.exists():
+                # Measure a full Sphinx build rather than an incremental one
+                shutil.rmtree(BUILD_DIR)
+            sample = run_stage(stage, args.python)
+            print(
+                f"{stage} #{iteration + 1}: {sample.wall_time:.2f}s wall,"
+                f" {sample.cpu_time:.2f}s cpu, {sample.max_rss / 2**20:.1f} MiB rss",
+                file=sys.stderr,
+                flush=True,
+            )
+            samples.append(sample)
+        results[stage] = {
+            "samples": [dataclasses.asdict(sample) for sample in samples],
+            "median": summarize(samples),
+        }
+
+    for stage, result in results.items():
+        median = result["median"]
+        print(
+            f"{stage:<18} {median['wall_time']:>9.2f}s wall"
+            f" {median['cpu_time']:>9.2f}s cpu"
+            f" {median['max_rss'] / 2**20:>9.1f} MiB rss"
+        )
+
+    if args.output:
+        data = {
+            "ansible_core_version": core_version(),
+            "iterations": args.iterations,
+            "stages": results,
+        }
+        args.output.write_text(json.dumps(data, indent=4) + "\n")
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        regressions = compare(results, baseline["stages"], args.threshold)
+        if baseline.get("ansible_core_version") != core_version():
+            print(
+                "Warning: the baseline was recorded against ansible-core"
+                f" {baseline.get('ansible_core_version')}, not {core_version()}",
+                file=sys.stderr,
+            )
+        if regressions:
+            print("\n".join(regressions), file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -10,10 +10,12 @@ __metaclass__ = type
 
 
 import argparse
+import cProfile
 import importlib
 import inspect
 import os.path
 import pkgutil
+import shlex
 import sys
 import typing as t
 
@@ -45,7 +47,10 @@ sys.path.insert(0, ansible_lib_path())
 sys.path.insert(0, build_lib_path())
 
 
-from build_ansible import commands, errors
+from build_ansible import commands, discovery, errors, timing
+
+
+PLUGIN_PACKAGE = 'build_ansible.command_plugins'
 
 
 def create_arg_parser(program_name):
@@ -59,13 +64,19 @@ def create_arg_parser(program_name):
     return parser
 
 
-def load(package: str, subclasses: t.Type[C]) -> list[t.Type[C]]:
-    """Load modules in the specified package and return concrete types that derive from the specified base class."""
+def load(package: str, subclasses: t.Type[C], failed: list[str] | None = None) -> list[t.Type[C]]:
+    """
+    Load modules in the specified package and return concrete types that derive from the specified base class.
+
+    The names of modules which could not be imported are appended to `failed`, if given.
+    """
     for module in pkgutil.iter_modules(importlib.import_module(package).__path__, f'{package}.'):
         try:
             importlib.import_module(module.name)
         except ImportError:
-            pass  # ignore plugins which are missing dependencies
+            # ignore plugins which are missing dependencies
+            if failed is not None:
+                failed.append(module.name)
 
     types: set[t.Type[C]] = set()
     queue: list[t.Type[C]] = [subclasses]
@@ -80,18 +91,120 @@ def load(package: str, subclasses: t.Type[C]) -> list[t.Type[C]]:
     return sorted(types, key=lambda sc: sc.__name__)
 
 
+def discover_commands():
+    """
+    Return a CommandSpec for each available subcommand.
+
+    The specs come from the plugin manifest when it is up to date, so no plugin module has to be imported.
+    Otherwise all plugins are imported and the manifest is rewritten, unless a plugin could not be imported:
+    it would otherwise stay hidden after its missing dependency is installed.
+    """
+    specs = discovery.load_manifest(PLUGIN_PACKAGE)
+
+    if specs is None:
+        failed: list[str] = []
+        subcommands = load(PLUGIN_PACKAGE, subclasses=commands.Command, failed=failed)
+        specs = [discovery.record_command(subcommand) for subcommand in subcommands]
+
+        if not failed:
+            discovery.save_manifest(PLUGIN_PACKAGE, specs)
+
+    return specs
+
+
+def find_command(subcommands, name):
+    """Import and return the subcommand with the given name."""
+    for subcommand in subcommands:
+        if subcommand.name == name:
+            return subcommand.load()
+
+    # Note: We should never trigger this because argparse should shield us from it
+    print('Error: {0} was not a recognized subcommand'.format(name))
+    sys.exit(1)
+
+
+def run_command(command, args, profiler=None):
+    """
+    Run a subcommand with its parsed arguments and return its exit status.
+
+    :kwarg profiler: A cProfile.Profile to profile the subcommand with
+    """
+    try:
+        if profiler is None:
+            return command.main(args)
+        return profiler.runcall(command.main, args)
+    except (errors.DependencyError, errors.MissingUserInput, errors.InvalidUserInput) as e:
+        print(e)
+        if args.debug:
+            raise
+        return 2
+
+
+def run_batch(arg_parser, subcommands, batch_file, phases, profiler=None):
+    """
+    Run each subcommand invocation listed in batch_file in this process.
+
+    The file holds one invocation per line, written as on the command line after build-ansible.py.
+    Empty lines and lines starting with ``#`` are ignored.  The batch stops at the first failing invocation.
+    The time spent in each phase is added up over all invocations.
+    """
+    if batch_file == '-':
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(batch_file) as f:
+            lines = f.read().splitlines()
+
+    for line in lines:
+        argv = shlex.split(line, comments=True)
+        if not argv:
+            continue
+
+        with phases.phase('argument parsing'):
+            args = arg_parser.parse_args(argv)
+        if args.batch is not None:
+            arg_parser.error('--batch cannot be used inside a batch file')
+        if args.command is None:
+            arg_parser.error('batch line does not specify a subcommand: {0}'.format(line))
+
+        print('Running: {0}'.format(line), flush=True)
+        with phases.phase('plugin loading'):
+            command = find_command(subcommands, args.command)
+        with phases.phase('command'):
+            retval = run_command(command, args, profiler)
+        if retval:
+            return retval
+
+    return 0
+
+
 def main():
     """
     Start our run.
 
     "It all starts here"
     """
-    subcommands = load('build_ansible.command_plugins', subclasses=commands.Command)
+    phases = timing.PhaseTimer()
+    import_timer = timing.ImportTimer()
+    # Imports made while discovering the plugins can only be timed if the timer is installed before the
+    # arguments are parsed
+    if '--timings' in sys.argv[1:]:
+        import_timer.install()
+
+    with phases.phase('plugin discovery'):
+        subcommands = discover_commands()
 
     arg_parser = create_arg_parser(os.path.basename(sys.argv[0]))
     arg_parser.add_argument('--debug', dest='debug', required=False, default=False,
                             action='store_true',
                             help='Show tracebacks and other debugging information')
+    arg_parser.add_argument('--batch', dest='batch', metavar='FILE', default=None,
+                            help='Run the subcommands listed in FILE, one per line, in this process'
+                            ' so the plugins are only loaded once.  Use - to read them from stdin')
+    arg_parser.add_argument('--profile', dest='profile', metavar='FILE', default=None,
+                            help='Profile the subcommand with cProfile and write the stats to FILE.'
+                            '  Read them with python -m pstats FILE')
+    arg_parser.add_argument('--timings', dest='timings', default=False, action='store_true',
+                            help='Print how long each phase of the run and the slowest imports took to stderr')
     subparsers = arg_parser.add_subparsers(title='Subcommands', dest='command',
                                            help='for help use build-ansible.py SUBCOMMANDS -h')
 
@@ -101,27 +214,31 @@ def main():
     if argcomplete:
         argcomplete.autocomplete(arg_parser)
 
-    args = arg_parser.parse_args(sys.argv[1:])
-    if args.command is None:
-        print('Please specify a subcommand to run')
-        sys.exit(1)
+    with phases.phase('argument parsing'):
+        args = arg_parser.parse_args(sys.argv[1:])
 
-    for subcommand in subcommands:
-        if subcommand.name == args.command:
-            command = subcommand
-            break
-    else:
-        # Note: We should never trigger this because argparse should shield us from it
-        print('Error: {0} was not a recognized subcommand'.format(args.command))
-        sys.exit(1)
+    profiler = cProfile.Profile() if args.profile else None
 
     try:
-        retval = command.main(args)
-    except (errors.DependencyError, errors.MissingUserInput, errors.InvalidUserInput) as e:
-        print(e)
-        if args.debug:
-            raise
-        sys.exit(2)
+        if args.batch is not None:
+            if args.command is not None:
+                arg_parser.error('--batch cannot be combined with a subcommand')
+            retval = run_batch(arg_parser, subcommands, args.batch, phases, profiler)
+        elif args.command is None:
+            print('Please specify a subcommand to run')
+            retval = 1
+        else:
+            with phases.phase('plugin loading'):
+                command = find_command(subcommands, args.command)
+            with phases.phase('command'):
+                retval = run_command(command, args, profiler)
+    finally:
+        if profiler is not None:
+            profiler.dump_stats(args.profile)
+        import_timer.uninstall()
+        if args.timings:
+            phases.report()
+            import_timer.report()
 
     sys.exit(retval)
 
@@ -4,30 +4,160 @@
 from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
 
+import hashlib
+import importlib.metadata
+import importlib.util
+import json
+import os
+import os.path
+import stat
+import tempfile
+
+
+CHUNK_SIZE = 64 * 1024
+
+
+def _file_has_content(filename, b_data):
+    """Check whether a file holds exactly b_data, reading it in chunks and stopping at the first difference."""
+    try:
+        if os.stat(filename).st_size != len(b_data):
+            return False
+
+        with open(filename, 'rb') as f:
+            offset = 0
+            while offset < len(b_data):
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk or chunk != b_data[offset:offset + len(chunk)]:
+                    return False
+                offset += len(chunk)
+
+            # The file may have grown since we checked its size
+            return not f.read(1)
+    except FileNotFoundError:
+        return False
+
+
+def _default_file_mode():
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
 
 def update_file_if_different(filename, b_data):
     """
     Replace file content only if content is different.
 
-    This preserves timestamps in case the file content has not changed.  It performs multiple
-    operations on the file so it is not atomic and may be slower than simply writing to the file.
+    This preserves timestamps in case the file content has not changed.  The new content is written to a temporary
+    file in the same directory which is then renamed over the old file, so readers never see a partially written file.
 
     :arg filename: The filename to write to
     :b_data: Byte string containing the data to write to the file
     """
+    b_data = memoryview(b_data).cast('B')
+
+    if _file_has_content(filename, b_data):
+        return False
+
     try:
-        with open(filename, 'rb') as f:
-            b_data_old = f.read()
-    except IOError as e:
-        if e.errno != 2:
-            raise
-        # File did not exist, set b_data_old to a sentinel value so that
-        # b_data gets written to the filename
-        b_data_old = None
-
-    if b_data_old != b_data:
-        with open(filename, 'wb') as f:
+        mode = stat.S_IMODE(os.stat(filename).st_mode)
+    except FileNotFoundError:
+        mode = _default_file_mode()
+
+    fd, tmp_filename = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(filename)),
+                                        prefix='.{0}.'.format(os.path.basename(filename)), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
             f.write(b_data)
-        return True
+        os.chmod(tmp_filename, mode)
+        os.replace(tmp_filename, filename)
+    except BaseException:
+        os.unlink(tmp_filename)
+        raise
+
+    return True
+
+
+def ansible_core_release_file():
+    """
+    Return the path to ansible-core's release.py, which holds its version, without importing ansible.
+
+    Returns None if ansible-core cannot be found.
+    """
+    spec = importlib.util.find_spec('ansible')
+    if spec is None or not spec.submodule_search_locations:
+        return None
+
+    return os.path.join(spec.submodule_search_locations[0], 'release.py')
+
 
-    return False
+def get_input_fingerprint(paths, packages=()):
+    """
+    Return a fingerprint of the content of the given input files.
+
+    Directories are walked and all files below them are included.  Missing files are recorded as missing.
+
+    :arg paths: The input files and directories.  None entries, for inputs which could not be located, are skipped
+    :kwarg packages: Names of installed distributions, such as jinja2, whose versions affect the output
+    """
+    digest = hashlib.sha256()
+
+    for package in packages:
+        try:
+            version = importlib.metadata.version(package)
+        except importlib.metadata.PackageNotFoundError:
+            version = 'missing'
+        digest.update('{0}=={1}\0'.format(package, version).encode('utf-8'))
+
+    for path in paths:
+        if path is None:
+            continue
+
+        if os.path.isdir(path):
+            filenames = sorted(os.path.join(root, file_name)
+                               for root, dir_names, file_names in os.walk(path)
+                               for file_name in file_names if not file_name.endswith('.pyc'))
+        else:
+            filenames = [path]
+
+        for filename in filenames:
+            digest.update(filename.encode('utf-8', 'surrogateescape') + b'\0')
+            try:
+                with open(filename, 'rb') as f:
+                    digest.update(hashlib.sha256(f.read()).digest())
+            except IOError:
+                digest.update(b'missing')
+
+    return digest.hexdigest()
+
+
+def _fingerprint_filename(filename):
+    return os.path.join(os.path.dirname(filename), '.{0}.inputs'.format(os.path.basename(filename)))
+
+
+def output_is_current(filename, fingerprint):
+    """
+    Check whether an output file was generated from inputs with the given fingerprint and is unchanged since.
+
+    :arg filename: The generated file
+    :arg fingerprint: The fingerprint of the current inputs, from :func:`get_input_fingerprint`
+    """
+    try:
+        with open(_fingerprint_filename(filename)) as f:
+            recorded = json.load(f)
+        output_stat = os.stat(filename)
+    except (IOError, ValueError):
+        return False
+
+    return recorded == {'inputs': fingerprint, 'size': output_stat.st_size, 'mtime_ns': output_stat.st_mtime_ns}
+
+
+def record_output_fingerprint(filename, fingerprint):
+    """
+    Record the fingerprint of the inputs an output file was generated from, next to the output file.
+
+    :arg filename: The generated file
+    :arg fingerprint: The fingerprint of the inputs, from :func:`get_input_fingerprint`
+    """
+    output_stat = os.stat(filename)
+    with open(_fingerprint_filename(filename), 'w') as f:
+        json.dump({'inputs': fingerprint, 'size': output_stat.st_size, 'mtime_ns': output_stat.st_mtime_ns}, f)
@@ -10,14 +10,17 @@ import os
 import os.path
 import pathlib
 
-import yaml
-from ansible.module_utils.six import string_types
-from ansible.module_utils.common.text.converters import to_bytes
-from antsibull_docs.jinja2.environment import doc_environment
-
 # Pylint doesn't understand Python3 namespace modules.
-from ..change_detection import update_file_if_different  # pylint: disable=relative-beyond-top-level
+from ..change_detection import (  # pylint: disable=relative-beyond-top-level
+    ansible_core_release_file,
+    get_input_fingerprint,
+    output_is_current,
+    record_output_fingerprint,
+    update_file_if_different,
+)
 from ..commands import Command  # pylint: disable=relative-beyond-top-level
+from ..templating import use_bytecode_cache  # pylint: disable=relative-beyond-top-level
+from ..yaml_loader import load_yaml_file  # pylint: disable=relative-beyond-top-level
 
 
 DEFAULT_TEMPLATE_FILE = 'collections_galaxy_meta.rst.j2'
@@ -26,6 +29,8 @@ DEFAULT_TEMPLATE_DIR = pathlib.Path(__file__).parents[4] / 'docs/templates'
 
 def normalize_options(options):
     """Normalize the options to make for easy templating"""
+    from ansible.module_utils.six import string_types
+
     for opt in options:
         if isinstance(opt['description'], string_types):
             opt['description'] = [opt['description']]
@@ -54,19 +59,30 @@ class DocumentCollectionMeta(Command):
         template_file_full_path = os.path.abspath(os.path.join(args.template_dir, args.template_file))
         template_file = os.path.basename(template_file_full_path)
         template_dir = os.path.dirname(template_file_full_path)
+        output_name = os.path.join(output_dir, template_file.replace('.j2', ''))
 
-        with open(args.collection_defs) as f:
-            options = yaml.safe_load(f)
+        # The page is rendered with the antsibull-docs filters
+        fingerprint = get_input_fingerprint([args.collection_defs, template_file_full_path, __file__,
+                                             ansible_core_release_file()],
+                                            packages=('antsibull-docs', 'jinja2'))
+        if output_is_current(output_name, fingerprint):
+            return 0
+
+        # imports here so that they are not loaded when the output is already up to date
+        from ansible.module_utils.common.text.converters import to_bytes
+        from antsibull_docs.jinja2.environment import doc_environment
+
+        options = load_yaml_file(args.collection_defs)
 
         normalize_options(options)
 
-        env = doc_environment(template_dir)
+        env = use_bytecode_cache(doc_environment(template_dir))
 
         template = env.get_template(template_file)
-        output_name = os.path.join(output_dir, template_file.replace('.j2', ''))
         temp_vars = {'options': options}
 
         data = to_bytes(template.render(temp_vars))
         update_file_if_different(output_name, data)
+        record_output_fingerprint(output_name, fingerprint)
 
         return 0
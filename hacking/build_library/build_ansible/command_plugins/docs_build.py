@@ -5,12 +5,18 @@
 # Make coding more python3-ish
 from __future__ import absolute_import, division, print_function
 
+import concurrent.futures
 import glob
+import hashlib
+import importlib.metadata
+import json
 import os
 import os.path
 import pathlib
 import shutil
 import subprocess
+import sys
+import time
 from tempfile import TemporaryDirectory
 
 import yaml
@@ -19,8 +25,9 @@ from ansible.release import __version__ as ansible_core__version__
 
 # Pylint doesn't understand Python3 namespace modules.
 # pylint: disable=relative-beyond-top-level
+from ..change_detection import get_input_fingerprint, update_file_if_different
 from ..commands import Command
-from ..errors import InvalidUserInput
+from ..errors import InvalidUserInput, MissingUserInput
 # pylint: enable=relative-beyond-top-level
 
 
@@ -29,6 +36,11 @@ __metaclass__ = type
 
 DEFAULT_TOP_DIR = pathlib.Path(__file__).parents[4]
 DEFAULT_OUTPUT_DIR = pathlib.Path(__file__).parents[4] / 'docs/docsite'
+DEFAULT_BUILD_DATA_MIRROR = pathlib.Path(__file__).parents[4] / '.cache/ansible-build-data'
+ANSIBLE_BUILD_DATA_URL = 'https://github.com/ansible-community/ansible-build-data'
+BUILD_DATA_INDEX_VERSION = 1
+PLUGIN_MANIFEST_FILE = '.docs-build-manifest.json'
+PLUGIN_MANIFEST_VERSION = 1
 
 
 class NoSuchFile(Exception):
@@ -39,11 +51,21 @@ class NoSuchFile(Exception):
 # Helpers
 #
 
-def find_latest_ansible_dir(build_data_working) -> tuple[str, "packaging.version.Version"]:
-    """Find the most recent ansible major version."""
+def find_latest_ansible_dir(build_data_working, index=None) -> tuple[str, "packaging.version.Version"]:
+    """
+    Find the most recent ansible major version.
+
+    :kwarg index: The build data index from :func:`load_build_data_index`.  If given, the version is looked up
+        in it instead of searching the checkout
+    """
     # imports here so that they don't cause unnecessary deps for all of the plugins
     from packaging.version import InvalidVersion, Version
 
+    if index is not None:
+        if index['devel'] is None:
+            raise NoSuchFile('Could not find an ansible data directory in {0}'.format(build_data_working))
+        return os.path.join(build_data_working, index['devel']), Version(index['devel'])
+
     ansible_directories = glob.glob(os.path.join(build_data_working, '[0-9.]*'))
 
     # Find the latest ansible version directory
@@ -84,12 +106,25 @@ def write_deps_file(filename, deps_data):
             f.write(f'{key}: {value}\n')
 
 
-def find_latest_deps_file(build_data_working, ansible_version: str) -> tuple[str, "packaging.version.Version"]:
-    """Find the most recent ansible deps file for the given ansible major version."""
+def find_latest_deps_file(build_data_working, ansible_version: str,
+                          index=None) -> tuple[str, "packaging.version.Version"]:
+    """
+    Find the most recent ansible deps file for the given ansible major version.
+
+    :kwarg index: The build data index from :func:`load_build_data_index`.  If given, the deps file is looked up
+        in it instead of parsing all deps files of the major version
+    """
     # imports here so that they don't cause unnecessary deps for all of the plugins
     from packaging.version import Version
 
     data_dir = os.path.join(build_data_working, ansible_version)
+
+    if index is not None:
+        major = index['majors'].get(ansible_version)
+        if major is None or not major['deps']:
+            raise Exception('No deps files exist for version {0}'.format(ansible_version))
+        latest = major['deps'][major['latest']]
+        return os.path.join(build_data_working, latest['path']), Version(latest['ansible_version'])
     deps_files = glob.glob(os.path.join(data_dir, '*.deps'))
     if not deps_files:
         raise Exception('No deps files exist for version {0}'.format(ansible_version))
@@ -110,14 +145,147 @@ def find_latest_deps_file(build_data_working, ansible_version: str) -> tuple[str
     return latest_deps_file, latest_ver
 
 
+def build_build_data_index(build_data_working):
+    """
+    Index the ansible versions in an ansible-build-data checkout.
+
+    For every major version directory this records whether it has an ``ansible.in`` and, for each deps file, the
+    ansible and ansible-core versions and the number of collections.  The latest deps file of each major version
+    and the latest major version with an ``ansible.in`` are precomputed, so that resolving a version is a lookup.
+    """
+    # imports here so that they don't cause unnecessary deps for all of the plugins
+    from packaging.version import InvalidVersion, Version
+
+    majors = {}
+    devel = None
+    for directory_name in sorted(glob.glob(os.path.join(build_data_working, '[0-9.]*'))):
+        if not os.path.isdir(directory_name):
+            continue
+
+        name = os.path.basename(directory_name)
+        deps = []
+        latest = None
+        for filename in sorted(glob.glob(os.path.join(directory_name, '*.deps'))):
+            deps_data = parse_deps_file(filename)
+            deps.append({
+                'path': os.path.relpath(filename, build_data_working),
+                'ansible_version': deps_data['_ansible_version'],
+                'core_version': deps_data.get('_ansible_core_version'),
+                'collections': sum(1 for key in deps_data if not key.startswith('_')),
+            })
+            if latest is None or Version(deps[-1]['ansible_version']) > Version(deps[latest]['ansible_version']):
+                latest = len(deps) - 1
+
+        has_ansible_in = os.path.exists(os.path.join(directory_name, 'ansible.in'))
+        majors[name] = {'ansible_in': has_ansible_in, 'deps': deps, 'latest': latest}
+
+        try:
+            version = Version(name)
+        except InvalidVersion:
+            continue
+
+        # For the devel build, we only need ansible.in
+        if has_ansible_in and version > Version('0') and (devel is None or version > Version(devel)):
+            devel = name
+
+    return {'majors': majors, 'devel': devel}
+
+
+def get_build_data_head(build_data_working):
+    """
+    Return the git commit an ansible-build-data checkout is at.
+
+    Returns None if the checkout is not a git repository or has local changes, in which case its index cannot be
+    cached.
+    """
+    try:
+        head = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=build_data_working, check=True,
+                              capture_output=True, text=True).stdout.strip()
+        status = subprocess.run(['git', 'status', '--porcelain'], cwd=build_data_working, check=True,
+                                capture_output=True, text=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    return None if status else head
+
+
+def load_build_data_index(build_data_working, index_dir):
+    """
+    Return the index of an ansible-build-data checkout, or None if the checkout cannot be indexed.
+
+    The index is cached in index_dir in a file named after the resolved checkout path, so that different checkouts
+    do not overwrite each other's index, and is rebuilt when the checkout moved to another commit.  Checkouts that
+    are not clean git checkouts are not indexed, for those the versions are looked up directly.
+    """
+    head = get_build_data_head(build_data_working)
+    if head is None:
+        return None
+
+    checkout_hash = hashlib.sha256(os.path.realpath(build_data_working).encode('utf-8')).hexdigest()[:16]
+    index_file = os.path.join(index_dir, 'ansible-build-data-index-{0}.json'.format(checkout_hash))
+
+    try:
+        with open(index_file) as f:
+            cached = json.load(f)
+    except (IOError, ValueError):
+        cached = {}
+
+    if cached.get('version') == BUILD_DATA_INDEX_VERSION and cached.get('head') == head:
+        return cached['index']
+
+    index = build_build_data_index(build_data_working)
+
+    data = json.dumps({'version': BUILD_DATA_INDEX_VERSION, 'head': head, 'index': index}, indent=2)
+    os.makedirs(index_dir, exist_ok=True)
+    update_file_if_different(index_file, data.encode('utf-8'))
+
+    return index
+
+
+def update_build_data_mirror(mirror_dir, refresh=False, offline=False):
+    """
+    Make sure there is a checkout of ansible-build-data in mirror_dir and return its path.
+
+    The repository is only cloned when the mirror does not exist yet, and only pulled when refresh is set.
+    In offline mode an existing mirror is used as is and a missing one is an error.
+    """
+    mirror_dir = os.path.abspath(str(mirror_dir))
+
+    if os.path.isdir(os.path.join(mirror_dir, '.git')):
+        if refresh:
+            print(f'Updating the ansible-build-data mirror in {mirror_dir!r}')
+            subprocess.run(['git', 'pull', '--ff-only', '--quiet'], check=True, cwd=mirror_dir)
+        return mirror_dir
+
+    if offline:
+        raise MissingUserInput(f'There is no ansible-build-data mirror in {mirror_dir!r} and --offline was'
+                               ' given.  Run once without --offline or pass a checkout with'
+                               ' --ansible-build-data.')
+
+    # Clone next to the mirror and move it into place so an interrupted clone does not leave a broken mirror
+    os.makedirs(os.path.dirname(mirror_dir), exist_ok=True)
+    with TemporaryDirectory(dir=os.path.dirname(mirror_dir)) as tmp_dir:
+        print(f'Cloning {ANSIBLE_BUILD_DATA_URL} into {mirror_dir!r}')
+        subprocess.run(['git', 'clone', '--quiet', ANSIBLE_BUILD_DATA_URL, 'ansible-build-data'],
+                       check=True, cwd=tmp_dir)
+        os.rename(os.path.join(tmp_dir, 'ansible-build-data'), mirror_dir)
+
+    return mirror_dir
+
+
 #
 # Subcommand core
 #
 
 def generate_core_docs(args):
     """Regenerate the documentation for all plugins listed in the plugin_to_collection_file."""
-    # imports here so that they don't cause unnecessary deps for all of the plugins
-    from antsibull_docs.cli import antsibull_docs
+    if args.limit_to is not None:
+        plugins, collections = args.limit_to
+        if set(collections) - {'ansible.builtin'} or any(not fqcn.startswith('ansible.builtin.')
+                                                         for dummy, fqcn in plugins):
+            raise InvalidUserInput('--limit-to can only name ansible.builtin plugins with "core".')
+        if not collections:
+            return generate_core_plugin_docs(plugins, args.top_dir, args.output_dir, args.sphinx_subset)
 
     with TemporaryDirectory() as tmp_dir:
         #
@@ -133,18 +301,16 @@ def generate_core_docs(args):
             f.write(yaml.dump(deps_file_contents))
 
         # Generate the plugin rst
-        full_command = [
-            'antsibull-docs',
-            'stable',
-            '--deps-file',
-            modified_deps_file,
-            '--ansible-core-source',
-            str(args.top_dir),
-            '--dest-dir',
-            args.output_dir,
-        ]
-        print(f"Running {full_command!r}:")
-        return antsibull_docs.run(full_command)
+        params = ['stable', '--deps-file', modified_deps_file]
+        if args.incremental:
+            return run_antsibull_docs_incremental(params, None, args.top_dir, args.output_dir,
+                                                  deps_file_contents, {'action': 'core'})
+        retval = run_antsibull_docs(params, None, args.top_dir, args.output_dir)
+
+        if not retval and args.sphinx_subset:
+            write_sphinx_subset(args.sphinx_subset, args.output_dir, ['ansible.builtin'])
+
+        return retval
 
         # If we make this more than just a driver for antsibull:
         # Run other rst generation
@@ -152,71 +318,448 @@ def generate_core_docs(args):
 
 
 #
-# Subcommand full
+# Limited builds
 #
 
-def generate_full_docs(args):
-    """Regenerate the documentation for all plugins listed in the plugin_to_collection_file."""
+def parse_limit_to(limit_to):
+    """
+    Parse the value of --limit-to.
+
+    Each comma-separated entry is a collection (``community.general``) or a plugin, optionally prefixed with its
+    type (``lookup:ansible.builtin.file``).  Plugins default to modules and to ansible.builtin.
+
+    :returns: A tuple of a list of ``(plugin_type, fqcn)`` tuples and a list of collection names
+    """
+    plugins = []
+    collections = []
+    for entry in limit_to.split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+
+        plugin_type, dummy, name = entry.rpartition(':')
+        parts = name.split('.')
+        if len(parts) == 2 and all(parts) and not plugin_type and ':' not in entry:
+            collections.append(name)
+        elif len(parts) in (1, 3) and all(parts) and (plugin_type.isidentifier() or ':' not in entry):
+            plugins.append((plugin_type or 'module', name if len(parts) == 3 else f'ansible.builtin.{name}'))
+        else:
+            raise InvalidUserInput(f'Cannot parse {entry!r} in --limit-to.  Use a collection name or a plugin'
+                                   ' name, optionally prefixed with its type, like lookup:ansible.builtin.file.')
+
+    return plugins, collections
+
+
+def generate_core_plugin_docs(plugins, top_dir, output_dir, sphinx_subset=None):
+    """
+    Generate the rst for a few ansible-core plugins with antsibull-docs' single plugin mode.
+
+    The plugin docs are read with the ansible-doc of the ansible-core source in top_dir.  No indexes are written.
+    Single plugin pages lack the collection's metadata and links, so with sphinx_subset they are only written to
+    the subset.  Otherwise they replace the pages in output_dir until the next full run.
+    """
     # imports here so that they don't cause unnecessary deps for all of the plugins
     from antsibull_docs.cli import antsibull_docs
 
+    # antsibull-docs runs ansible-doc from $PATH, make that the one of the ansible-core being documented
+    top_dir = os.path.abspath(str(top_dir))
+    old_environ = os.environ.copy()
+    if os.path.isdir(os.path.join(top_dir, 'bin')):
+        os.environ['PATH'] = os.pathsep.join([os.path.join(top_dir, 'bin'), os.environ.get('PATH', '')])
+    os.environ['PYTHONPATH'] = os.pathsep.join(
+        path for path in (os.path.join(top_dir, 'lib'), os.environ.get('PYTHONPATH')) if path)
+
+    written = []
+    failed = []
+    try:
+        with TemporaryDirectory() as generated_dir:
+            pages_dir = os.path.join(generated_dir, 'pages') if sphinx_subset else str(output_dir)
+            for plugin_type, fqcn in plugins:
+                full_command = ['antsibull-docs', 'plugin', '--plugin-type', plugin_type, '--dest-dir',
+                                generated_dir, fqcn]
+                print(f"Running {full_command!r}:")
+                generated_file = os.path.join(generated_dir, f'{fqcn}_{plugin_type}.rst')
+                if antsibull_docs.run(full_command) or not os.path.exists(generated_file):
+                    failed.append(fqcn)
+                    continue
+
+                namespace, collection, plugin = fqcn.split('.')
+                rst_file = os.path.join('collections', namespace, collection, f'{plugin}_{plugin_type}.rst')
+                os.makedirs(os.path.dirname(os.path.join(pages_dir, rst_file)), exist_ok=True)
+                with open(generated_file, 'rb') as f:
+                    update_file_if_different(os.path.join(pages_dir, rst_file), f.read())
+                written.append(rst_file)
+
+            if sphinx_subset:
+                write_sphinx_subset(sphinx_subset, pages_dir, files=written)
+            elif written:
+                invalidate_plugin_manifest(output_dir)
+    finally:
+        os.environ.clear()
+        os.environ.update(old_environ)
+
+    if failed:
+        print('Could not generate the docs for: {0}'.format(', '.join(failed)))
+        return 1
+
+    return 0
+
+
+def write_sphinx_subset(subset_dir, output_dir, collections=(), files=()):
+    """
+    Create a Sphinx source directory with just the rst of some collections and plugins from output_dir.
+
+    output_dir is laid out like the rst directory of the docsite, with the plugin rst below ``collections/``.
+
+    It can be built with the docsite's configuration, for instance
+    ``sphinx-build -c rst -t core SUBSET_DIR OUTPUT_DIR``, to check the rendering of a few plugins quickly.
+    Sphinx warns about references to pages which are not in the subset.
+
+    :kwarg collections: Collections whose whole tree is copied
+    :kwarg files: rst files, relative to output_dir, to copy
+    """
+    collections_dir = os.path.join(str(output_dir), 'collections')
+    files = list(files)
+    for collection in collections:
+        tree = collection_dir(collections_dir, collection)
+        for root, dummy, file_names in os.walk(tree):
+            files.extend(os.path.relpath(os.path.join(root, file_name), str(output_dir))
+                         for file_name in file_names if file_name.endswith('.rst'))
+
+    shutil.rmtree(subset_dir, ignore_errors=True)
+    for rst_file in files:
+        os.makedirs(os.path.dirname(os.path.join(subset_dir, rst_file)), exist_ok=True)
+        shutil.copyfile(os.path.join(str(output_dir), rst_file), os.path.join(subset_dir, rst_file))
+
+    entries = '\n'.join(f'   {rst_file[:-len(".rst")]}' for rst_file in sorted(files))
+    os.makedirs(subset_dir, exist_ok=True)
+    with open(os.path.join(subset_dir, 'index.rst'), 'w') as f:
+        f.write(f'Plugin documentation subset\n===========================\n\n.. toctree::\n   :maxdepth: 1\n\n'
+                f'{entries}\n')
+
+    print(f'Wrote a Sphinx source subset with {len(files)} files to {subset_dir!r}')
+
+
+#
+# Incremental builds
+#
+
+def run_antsibull_docs(params, cwd, top_dir, output_dir):
+    """Run antsibull-docs with params in cwd, or in the current directory if cwd is None."""
+    # imports here so that they don't cause unnecessary deps for all of the plugins
+    from antsibull_docs.cli import antsibull_docs
+
+    old_cwd = os.getcwd()
+    try:
+        if cwd is not None:
+            os.chdir(cwd)
+        # Generate the plugin rst
+        full_command = ['antsibull-docs'] + params + [
+            '--ansible-core-source',
+            os.path.join(old_cwd, str(top_dir)),
+            '--dest-dir',
+            os.path.join(old_cwd, str(output_dir)),
+        ]
+        print(f"Running {full_command!r} in {cwd or old_cwd!r}:")
+        return antsibull_docs.run(full_command)
+    finally:
+        os.chdir(old_cwd)
+
+
+def collection_dir(collections_dir, collection):
+    """Return the directory antsibull-docs writes the rst for a collection to."""
+    namespace, name = collection.split('.', 1)
+    return os.path.join(collections_dir, namespace, name)
+
+
+def load_plugin_manifest(collections_dir):
+    """Return the manifest of the last successful incremental build in collections_dir, or None."""
+    try:
+        with open(os.path.join(collections_dir, PLUGIN_MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+    except (IOError, ValueError):
+        return None
+
+    if manifest.get('version') != PLUGIN_MANIFEST_VERSION:
+        return None
+
+    return manifest
+
+
+def forget_generate_all_state(output_dir):
+    """
+    Make the next generate-all run regenerate the plugin rst in output_dir.
+
+    generate-all keeps its state in the docsite directory above the rst directory, and skips the plugin stage
+    while its inputs are unchanged, regardless of what else wrote to the rst.
+    """
+    from .generate_all import PLUGIN_STAGES, forget_stages
+
+    forget_stages(os.path.dirname(os.path.abspath(str(output_dir))), PLUGIN_STAGES)
+
+
+def invalidate_plugin_manifest(output_dir):
+    """
+    Remove the manifest of the last incremental build from output_dir, as well as the generate-all state.
+
+    Limited builds change the plugin rst without updating the indexes or the manifest, so the next incremental
+    build or generate-all run has to regenerate everything.
+    """
+    try:
+        os.unlink(os.path.join(str(output_dir), 'collections', PLUGIN_MANIFEST_FILE))
+    except FileNotFoundError:
+        pass
+
+    forget_generate_all_state(output_dir)
+
+
+def sync_tree(src_dir, dest_dir, prune=()):
+    """
+    Copy the files below src_dir to dest_dir, only rewriting files whose content changed.
+
+    :kwarg prune: Directories, relative to dest_dir, in which files and directories that are not in src_dir
+        are removed
+    """
+    for root, dummy, file_names in os.walk(src_dir):
+        for file_name in file_names:
+            src_path = os.path.join(root, file_name)
+            dest_path = os.path.join(dest_dir, os.path.relpath(src_path, src_dir))
+            os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+            with open(src_path, 'rb') as f:
+                update_file_if_different(dest_path, f.read())
+
+    for prune_dir in prune:
+        # Bottom up, so the walk does not descend into directories removed here
+        for root, dir_names, file_names in os.walk(os.path.join(dest_dir, prune_dir), topdown=False):
+            for file_name in file_names:
+                dest_path = os.path.join(root, file_name)
+                if not os.path.exists(os.path.join(src_dir, os.path.relpath(dest_path, dest_dir))):
+                    os.unlink(dest_path)
+            for dir_name in dir_names:
+                dest_path = os.path.join(root, dir_name)
+                if not os.path.exists(os.path.join(src_dir, os.path.relpath(dest_path, dest_dir))):
+                    shutil.rmtree(dest_path, ignore_errors=True)
+
+
+def run_antsibull_docs_incremental(params, cwd, top_dir, output_dir, deps_data, settings):
+    """
+    Run antsibull-docs unless no collection changed since the last successful incremental build.
+
+    The versions of the collections in deps_data, plus a hash of the ansible-core sources standing in for the
+    version of ansible.builtin, are compared with the manifest stored by the last build.  If they, the other
+    settings and the ansible-core and antsibull-docs versions are unchanged, antsibull-docs is not run at all.
+
+    Otherwise all collections are regenerated, as the collection and environment variable indexes list the short
+    descriptions and deprecations of the plugins of every collection.  The rst is generated in a temporary
+    directory and copied to the output directory, only rewriting files whose content changed so that Sphinx can
+    skip the others.
+    """
+    collections_dir = os.path.join(str(output_dir), 'collections')
+
+    versions = {name: version for name, version in deps_data.items() if not name.startswith('_')}
+    versions['ansible.builtin'] = get_input_fingerprint([os.path.join(str(top_dir), 'lib', 'ansible')])
+
+    try:
+        antsibull_docs_version = importlib.metadata.version('antsibull-docs')
+    except importlib.metadata.PackageNotFoundError:
+        antsibull_docs_version = None
+    settings = dict(settings, params=params[:1], core_version=ansible_core__version__,
+                    antsibull_docs_version=antsibull_docs_version)
+
+    manifest = load_plugin_manifest(collections_dir)
+    if manifest is not None and manifest['settings'] == settings and set(manifest['collections']) == set(versions):
+        changed = sorted(name for name, version in versions.items()
+                         if manifest['collections'][name] != version
+                         or not os.path.isdir(collection_dir(collections_dir, name)))
+
+        if not changed:
+            print('The plugin rst is up to date with the deps file')
+            return 0
+
+        print('Regenerating the rst for all collections, as {0} changed'.format(', '.join(changed)))
+    else:
+        print('Regenerating the rst for all collections')
+
+    with TemporaryDirectory() as generated_dir:
+        retval = run_antsibull_docs(params, cwd, top_dir, generated_dir)
+        if retval:
+            return retval
+
+        generated_collections_dir = os.path.join(generated_dir, 'collections')
+        sync_tree(generated_collections_dir, collections_dir,
+                  prune=[os.path.relpath(collection_dir(collections_dir, name), collections_dir)
+                         for name in versions])
+
+    if manifest is not None:
+        for name in set(manifest['collections']) - set(versions):
+            shutil.rmtree(collection_dir(collections_dir, name), ignore_errors=True)
+
+    data = json.dumps({'version': PLUGIN_MANIFEST_VERSION, 'settings': settings, 'collections': versions},
+                      indent=2, sort_keys=True)
+    update_file_if_different(os.path.join(collections_dir, PLUGIN_MANIFEST_FILE), data.encode('utf-8'))
+    forget_generate_all_state(output_dir)
+
+    return 0
+
+
+#
+# Helpers for full and matrix
+#
+
+def get_build_data(args):
+    """
+    Return the ansible-build-data checkout to use and its index, or None if it has no index.
+
+    This is the checkout given with --ansible-build-data, or else the local mirror.
+    """
+    if args.ansible_build_data:
+        build_data_working = args.ansible_build_data
+    else:
+        build_data_working = update_build_data_mirror(args.build_data_mirror, refresh=args.refresh_build_data,
+                                                      offline=args.offline)
+    # If we want to validate that the ansible version and ansible-core branch version match,
+    # this would be the place to do it.
+
+    # The index is stored next to the mirror even for other checkouts, as it is keyed by the checkout path
+    index = load_build_data_index(build_data_working,
+                                  os.path.dirname(os.path.abspath(str(args.build_data_mirror)).rstrip(os.sep)))
+
+    return build_data_working, index
+
+
+def build_version_docs(build_data_working, index, ansible_version, top_dir, output_dir, incremental=False,
+                       collections=None):
+    """
+    Generate the plugin rst for one version of the ansible package, or for devel if ansible_version is None.
+
+    This changes the working directory while antsibull-docs runs, so concurrent builds need separate processes.
+
+    :kwarg collections: If given, only generate the rst of these collections, and no indexes
+    """
     with TemporaryDirectory() as tmp_dir:
-        subprocess.run(
-            ['git', 'clone', 'https://github.com/ansible-community/ansible-build-data'],
-            check=True,
-            cwd=tmp_dir,
-        )
-        # If we want to validate that the ansible version and ansible-core branch version match,
-        # this would be the place to do it.
-
-        build_data_working = os.path.join(tmp_dir, 'ansible-build-data')
-        if args.ansible_build_data:
-            build_data_working = args.ansible_build_data
-
-        ansible_version: str = args.ansible_version
         if ansible_version is None:
-            devel_dir, devel_version = find_latest_ansible_dir(build_data_working)
+            devel_dir, devel_version = find_latest_ansible_dir(build_data_working, index)
             params = ['devel', '--pieces-file', 'ansible.in', '--major-version', str(devel_version.major)]
-            cwd = str(devel_dir)
-        else:
-            latest_deps_file, ansible_version_ver = find_latest_deps_file(build_data_working, ansible_version)
-            deps_dir = os.path.dirname(latest_deps_file)
 
-            # Make a copy of the deps file so that we can set the ansible-core version we'll use
-            modified_deps_file = os.path.join(tmp_dir, 'ansible.deps')
-            shutil.copyfile(latest_deps_file, modified_deps_file)
+            if collections is not None:
+                with open(os.path.join(devel_dir, 'ansible.in')) as f:
+                    pieces = [line for line in f.read().splitlines() if line.strip() in collections]
+                pieces_file = os.path.join(tmp_dir, 'ansible.in')
+                with open(pieces_file, 'w') as f:
+                    f.write(''.join(f'{line}\n' for line in pieces))
+                params = ['devel', '--pieces-file', pieces_file, '--major-version',
+                          str(devel_version.major), '--no-indexes']
 
-            # Make a copy of collection-meta.yaml
-            shutil.copyfile(os.path.join(deps_dir, 'collection-meta.yaml'), os.path.join(tmp_dir, 'collection-meta.yaml'))
+            # The collection versions of devel are only known once antsibull-docs fetched them
+            if incremental:
+                print('Incremental builds need --ansible-version, regenerating the rst for all collections')
+            return run_antsibull_docs(params, str(devel_dir), top_dir, output_dir)
 
-            # Put our version of ansible-core into the deps file
-            deps_data = parse_deps_file(modified_deps_file)
+        latest_deps_file, ansible_version_ver = find_latest_deps_file(build_data_working, ansible_version, index)
+        deps_dir = os.path.dirname(latest_deps_file)
 
-            deps_data['_ansible_core_version'] = ansible_core__version__
+        # Make a copy of the deps file so that we can set the ansible-core version we'll use
+        modified_deps_file = os.path.join(tmp_dir, 'ansible.deps')
+        shutil.copyfile(latest_deps_file, modified_deps_file)
 
-            write_deps_file(modified_deps_file, deps_data)
+        # Make a copy of collection-meta.yaml
+        shutil.copyfile(os.path.join(deps_dir, 'collection-meta.yaml'), os.path.join(tmp_dir, 'collection-meta.yaml'))
 
-            params = ['stable', '--deps-file', 'ansible.deps', '--version', str(ansible_version_ver)]
-            cwd = str(tmp_dir)
+        # Put our version of ansible-core into the deps file
+        deps_data = parse_deps_file(modified_deps_file)
 
-        old_cwd = os.getcwd()
-        try:
-            os.chdir(cwd)
-            # Generate the plugin rst
-            full_command = ['antsibull-docs'] + params + [
-                '--ansible-core-source',
-                os.path.join(old_cwd, str(args.top_dir)),
-                '--dest-dir',
-                os.path.join(old_cwd, args.output_dir),
-            ]
-            print(f"Running {full_command!r} in {cwd!r}:")
-            return antsibull_docs.run(full_command)
-        finally:
-            os.chdir(old_cwd)
+        deps_data['_ansible_core_version'] = ansible_core__version__
 
-        # If we make this more than just a driver for antsibull:
-        # Run other rst generation
-        # Run sphinx build
+        params = ['stable', '--deps-file', 'ansible.deps', '--version', str(ansible_version_ver)]
+        if collections is not None:
+            deps_data = {name: value for name, value in deps_data.items()
+                         if name.startswith('_') or name in collections}
+            params.append('--no-indexes')
+
+        write_deps_file(modified_deps_file, deps_data)
+
+        if incremental:
+            return run_antsibull_docs_incremental(params, str(tmp_dir), top_dir, output_dir, deps_data,
+                                                  {'action': 'full', 'version': str(ansible_version_ver)})
+        return run_antsibull_docs(params, str(tmp_dir), top_dir, output_dir)
+
+
+def _timed_build_version_docs(*args):
+    """Run build_version_docs() and return its exit status and how long it took.  This runs in a worker process."""
+    start = time.perf_counter()
+    retval = build_version_docs(*args)
+    return retval, time.perf_counter() - start
+
+
+#
+# Subcommand full
+#
+
+def generate_full_docs(args):
+    """Regenerate the documentation for all plugins listed in the plugin_to_collection_file."""
+    build_data_working, index = get_build_data(args)
+
+    collections = None
+    if args.limit_to is not None:
+        plugins, collections = args.limit_to
+        # Plugins from collections can only be documented as part of their collection
+        collections = sorted(set(collections) | {fqcn.rsplit('.', 1)[0] for dummy, fqcn in plugins})
+
+    retval = build_version_docs(build_data_working, index, args.ansible_version, args.top_dir, args.output_dir,
+                                args.incremental, collections)
+
+    if collections is not None:
+        invalidate_plugin_manifest(args.output_dir)
+
+    if not retval and args.sphinx_subset:
+        write_sphinx_subset(args.sphinx_subset, args.output_dir, list(dict.fromkeys(['ansible.builtin', *collections])))
+
+    return retval
+
+    # If we make this more than just a driver for antsibull:
+    # Run other rst generation
+    # Run sphinx build
+
+
+#
+# Subcommand matrix
+#
+
+def generate_matrix_docs(args):
+    """
+    Regenerate the documentation for several versions of the ansible package at once.
+
+    The versions share the ansible-build-data checkout and the ansible-core source.  Each one is built by its own
+    worker process into a subdirectory of the output directory named after the version.
+    """
+    build_data_working, index = get_build_data(args)
+    top_dir = os.path.abspath(str(args.top_dir))
+    output_dir = os.path.abspath(str(args.output_dir))
+
+    # Flush before forking so buffered output is not duplicated by the workers.
+    sys.stdout.flush()
+
+    results = {}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        futures = {executor.submit(_timed_build_version_docs, build_data_working, index, version, top_dir,
+                                   os.path.join(output_dir, version), args.incremental): version
+                   for version in args.ansible_versions}
+
+        for future in concurrent.futures.as_completed(futures):
+            version = futures[future]
+            try:
+                results[version] = future.result()
+            except Exception as e:  # pylint: disable=broad-except
+                print(f'{version}: failed: {e}')
+                results[version] = (1, None)
+
+    print('Summary:')
+    for version in args.ansible_versions:
+        retval, elapsed = results[version]
+        elapsed = 'n/a' if elapsed is None else f'{elapsed:.1f}s'
+        print(f'  {version:<10} {"failed" if retval else "ok":<8} {elapsed:>10}  {os.path.join(output_dir, version)}')
+
+    return 1 if any(retval for retval, elapsed in results.values()) else 0
 
 
 class CollectionPluginDocs(Command):
@@ -224,6 +767,7 @@ class CollectionPluginDocs(Command):
     _ACTION_HELP = """Action to perform.
         full: Regenerate the rst for the full ansible website.
         core: Regenerate the rst for plugins in ansible-core and then build the website.
+        matrix: Regenerate the rst for the full ansible website for each of --ansible-versions.
     """
 
     @classmethod
@@ -236,7 +780,7 @@ class CollectionPluginDocs(Command):
                             ' hierarchy.')
         # I think we should make the actions a subparser but need to look in git history and see if
         # we tried that and changed it for some reason.
-        parser.add_argument('action', action='store', choices=('full', 'core'),
+        parser.add_argument('action', action='store', choices=('full', 'core', 'matrix'),
                             default='full', help=cls._ACTION_HELP)
         parser.add_argument("-o", "--output-dir", action="store", dest="output_dir",
                             default=DEFAULT_OUTPUT_DIR,
@@ -247,16 +791,49 @@ class CollectionPluginDocs(Command):
                             " tarball.")
         parser.add_argument("-l", "--limit-to-modules", '--limit-to', action="store",
                             dest="limit_to", default=None,
-                            help="Limit building module documentation to comma-separated list of"
-                            " plugins. Specify non-existing plugin name for no plugins.")
+                            help="Limit building plugin documentation to a comma-separated list of"
+                            " plugins and collections.  Plugins may be prefixed with their type, as in"
+                            " lookup:ansible.builtin.file, and default to modules in ansible.builtin."
+                            "  With core, listed plugins are documented one by one without rebuilding"
+                            " the rest; with full, only the collections of the listed plugins are"
+                            " regenerated.  Indexes are not updated, and the next --incremental build"
+                            " regenerates everything.")
+        parser.add_argument("--sphinx-subset", action="store", dest="sphinx_subset", default=None,
+                            help="With --limit-to, also write a Sphinx source directory holding only the"
+                            " regenerated rst to this directory, to build a preview with"
+                            " sphinx-build -c rst -t core SPHINX_SUBSET OUTPUT.  Plugins documented one"
+                            " by one with core are then only written to this directory.")
         parser.add_argument('--ansible-version', action='store',
                             dest='ansible_version', default=None,
                             help='The version of the ansible package to make documentation for.'
                             '  This only makes sense when used with full.')
+        parser.add_argument('--ansible-versions', action='store', dest='ansible_versions', default=None,
+                            help='Comma-separated list of versions of the ansible package to make'
+                            ' documentation for.  Each version is written to a subdirectory of the output'
+                            ' directory.  Required for matrix.')
+        parser.add_argument('--incremental', action='store_true', dest='incremental', default=False,
+                            help='Skip regenerating the rst if no collection version changed since the last'
+                            ' incremental build into the output directory, and only rewrite files whose'
+                            ' content changed.  Needs --ansible-version with full.')
+        parser.add_argument('-j', '--jobs', action='store', type=int, default=None,
+                            help='Maximum number of versions to build at the same time with matrix.'
+                            ' (Default: 4, or the number of CPUs if lower)')
         parser.add_argument('--ansible-build-data', action='store',
                             dest='ansible_build_data', default=None,
-                            help='A checkout of the ansible-build-data repo.  Useful for'
-                            ' debugging.')
+                            help='A checkout of the ansible-build-data repo to use instead of the'
+                            ' mirror.  Useful for debugging.')
+        parser.add_argument('--build-data-mirror', action='store', dest='build_data_mirror',
+                            default=None,
+                            help='Directory to keep a clone of the ansible-build-data repo in, which is'
+                            ' reused by later builds.  Only used with full.  (Default: the'
+                            ' ANSIBLE_BUILD_DATA_MIRROR environment variable or {0})'.format(DEFAULT_BUILD_DATA_MIRROR))
+        parser.add_argument('--refresh-build-data', action='store_true', dest='refresh_build_data',
+                            default=False,
+                            help='Pull the latest changes into the ansible-build-data mirror before'
+                            ' building.')
+        parser.add_argument('--offline', action='store_true', dest='offline', default=False,
+                            help='Do not access the network: use the ansible-build-data mirror as it is'
+                            ' and fail if it does not exist.')
 
     @staticmethod
     def main(args):
@@ -265,6 +842,38 @@ class CollectionPluginDocs(Command):
         if args.ansible_version and args.action != 'full':
             raise InvalidUserInput('--ansible-version is only for use with "full".')
 
+        if args.action == 'matrix':
+            if not args.ansible_versions:
+                raise MissingUserInput('matrix needs the versions to build with --ansible-versions.')
+            # Drop blank entries and duplicates, which would build into the same output directory
+            args.ansible_versions = list(dict.fromkeys(version.strip() for version in args.ansible_versions.split(',')
+                                                       if version.strip()))
+            if not args.ansible_versions:
+                raise InvalidUserInput('--ansible-versions does not list any versions.')
+            if args.jobs is None:
+                # Each build runs antsibull-docs over a full collection tree, so only a few run at once by default
+                args.jobs = min(4, os.cpu_count() or 1)
+            if args.jobs < 1:
+                raise InvalidUserInput('--jobs must be at least 1.')
+        elif args.ansible_versions or args.jobs is not None:
+            raise InvalidUserInput('--ansible-versions and --jobs are only for use with "matrix".')
+
+        if args.limit_to is not None:
+            if args.action == 'matrix':
+                raise InvalidUserInput('--limit-to is only for use with "core" and "full".')
+            if args.incremental:
+                raise InvalidUserInput('--limit-to cannot be used with --incremental.')
+            args.limit_to = parse_limit_to(args.limit_to)
+        elif args.sphinx_subset:
+            raise InvalidUserInput('--sphinx-subset needs --limit-to.')
+
+        if args.offline and args.refresh_build_data:
+            raise InvalidUserInput('--refresh-build-data cannot be used with --offline.')
+
+        # Read here, parser defaults are stored in the cached command discovery results
+        if not args.build_data_mirror:
+            args.build_data_mirror = os.environ.get('ANSIBLE_BUILD_DATA_MIRROR') or str(DEFAULT_BUILD_DATA_MIRROR)
+
         if not args.output_dir:
             args.output_dir = os.path.abspath(str(DEFAULT_OUTPUT_DIR))
 
@@ -274,6 +883,9 @@ class CollectionPluginDocs(Command):
         if args.action == 'core':
             return generate_core_docs(args)
 
+        if args.action == 'matrix':
+            return generate_matrix_docs(args)
+
         raise NotImplementedError('New actions have to be explicitly supported by the code')
 
         # return 0
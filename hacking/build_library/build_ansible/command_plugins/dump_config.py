@@ -6,17 +6,23 @@
 from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
 
+import json
 import os
 import os.path
 import pathlib
 
-import yaml
-from jinja2 import Environment, FileSystemLoader
-from ansible.module_utils.common.text.converters import to_bytes
-
 # Pylint doesn't understand Python3 namespace modules.
-from ..change_detection import update_file_if_different  # pylint: disable=relative-beyond-top-level
+from ..change_detection import (  # pylint: disable=relative-beyond-top-level
+    ansible_core_release_file,
+    get_input_fingerprint,
+    output_is_current,
+    record_output_fingerprint,
+    update_file_if_different,
+)
 from ..commands import Command  # pylint: disable=relative-beyond-top-level
+from ..errors import InvalidUserInput  # pylint: disable=relative-beyond-top-level
+from ..templating import get_environment  # pylint: disable=relative-beyond-top-level
+from ..yaml_loader import load_yaml_file  # pylint: disable=relative-beyond-top-level
 
 
 DEFAULT_TEMPLATE_FILE = 'config.rst.j2'
@@ -42,41 +48,76 @@ def fix_description(config_options):
     return config_options
 
 
+def render_json(config_options):
+    """Return the normalized config options as a JSON document."""
+    return json.dumps(config_options, indent=2, sort_keys=True, default=str) + '\n'
+
+
 class DocumentConfig(Command):
     name = 'document-config'
 
     @classmethod
     def init_parser(cls, add_parser):
         parser = add_parser(cls.name, description='Generate module documentation from metadata')
-        parser.add_argument("-t", "--template-file", action="store", dest="template_file",
-                            default=DEFAULT_TEMPLATE_FILE,
-                            help="Jinja2 template to use for the config")
+        parser.add_argument("-t", "--template-file", action="append", dest="template_files", default=None,
+                            help="Jinja2 template to use for the config.  May be given more than once to render"
+                            " several templates from a single parse of the config definitions."
+                            " (Default: {0})".format(DEFAULT_TEMPLATE_FILE))
         parser.add_argument("-T", "--template-dir", action="store", dest="template_dir",
                             default=str(DEFAULT_TEMPLATE_DIR),
                             help="directory containing Jinja2 templates")
         parser.add_argument("-o", "--output-dir", action="store", dest="output_dir", default='/tmp/',
                             help="Output directory for rst files")
+        parser.add_argument("--json-file", action="store", dest="json_file", default=None,
+                            help="Also write the normalized config options to this file as JSON")
         parser.add_argument("config_defs", metavar="CONFIG-OPTION-DEFINITIONS.yml", type=str,
                             help="Source for config option docs")
 
     @staticmethod
     def main(args):
         output_dir = os.path.abspath(args.output_dir)
-        template_file_full_path = os.path.abspath(os.path.join(args.template_dir, args.template_file))
-        template_file = os.path.basename(template_file_full_path)
-        template_dir = os.path.dirname(template_file_full_path)
-
-        with open(args.config_defs) as f:
-            config_options = yaml.safe_load(f)
-
-        config_options = fix_description(config_options)
-
-        env = Environment(loader=FileSystemLoader(template_dir), trim_blocks=True,)
-        template = env.get_template(template_file)
-        output_name = os.path.join(output_dir, template_file.replace('.j2', ''))
+        core_release_file = ansible_core_release_file()
+
+        # Map of output file to (template file or None for the JSON output, fingerprint of its inputs)
+        outputs = {}
+        for template_file in args.template_files or [DEFAULT_TEMPLATE_FILE]:
+            template_file_full_path = os.path.abspath(os.path.join(args.template_dir, template_file))
+            output_name = os.path.join(output_dir, os.path.basename(template_file_full_path).replace('.j2', ''))
+            if output_name in outputs and outputs[output_name][0] != template_file_full_path:
+                raise InvalidUserInput('Templates {0} and {1} would both be written to {2}.'.format(
+                    outputs[output_name][0], template_file_full_path, output_name))
+            outputs[output_name] = (template_file_full_path,
+                                    get_input_fingerprint([args.config_defs, template_file_full_path, __file__,
+                                                           core_release_file], packages=('jinja2',)))
+
+        if args.json_file:
+            if os.path.abspath(args.json_file) in outputs:
+                raise InvalidUserInput('--json-file {0} is also the output of template {1}.'.format(
+                    args.json_file, outputs[os.path.abspath(args.json_file)][0]))
+            outputs[os.path.abspath(args.json_file)] = (
+                None, get_input_fingerprint([args.config_defs, __file__, core_release_file]))
+
+        outputs = {output_name: output for output_name, output in outputs.items()
+                   if not output_is_current(output_name, output[1])}
+        if not outputs:
+            return 0
+
+        config_options = fix_description(load_yaml_file(args.config_defs))
         temp_vars = {'config_options': config_options}
 
-        data = to_bytes(template.render(temp_vars))
-        update_file_if_different(output_name, data)
+        # Rendering is cheap next to parsing the definitions, so the outputs are simply rendered in turn
+        environments = {}
+        for output_name, (template_file_full_path, fingerprint) in outputs.items():
+            if template_file_full_path is None:
+                data = render_json(config_options)
+            else:
+                template_dir = os.path.dirname(template_file_full_path)
+                if template_dir not in environments:
+                    environments[template_dir] = get_environment(template_dir, trim_blocks=True)
+                template = environments[template_dir].get_template(os.path.basename(template_file_full_path))
+                data = template.render(temp_vars)
+
+            update_file_if_different(output_name, data.encode('utf-8'))
+            record_output_fingerprint(output_name, fingerprint)
 
         return 0
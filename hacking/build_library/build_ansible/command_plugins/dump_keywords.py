@@ -7,37 +7,44 @@ from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
 
 import importlib
+import json
+import os
 import os.path
 import pathlib
 import re
-from ansible.module_utils.compat.version import LooseVersion
-
-import jinja2
-import yaml
-from jinja2 import Environment, FileSystemLoader
-
-from ansible.module_utils.common.text.converters import to_bytes
 
 # Pylint doesn't understand Python3 namespace modules.
-from ..change_detection import update_file_if_different  # pylint: disable=relative-beyond-top-level
+from ..change_detection import (  # pylint: disable=relative-beyond-top-level
+    ansible_core_release_file,
+    get_input_fingerprint,
+    output_is_current,
+    record_output_fingerprint,
+    update_file_if_different,
+)
 from ..commands import Command  # pylint: disable=relative-beyond-top-level
+from ..errors import MissingUserInput  # pylint: disable=relative-beyond-top-level
+from ..templating import get_environment  # pylint: disable=relative-beyond-top-level
+from ..yaml_loader import load_yaml_file  # pylint: disable=relative-beyond-top-level
 
 
 DEFAULT_TEMPLATE_DIR = str(pathlib.Path(__file__).resolve().parents[4] / 'docs/templates')
+DEFAULT_CACHE_FILE = str(pathlib.Path(__file__).resolve().parents[4] / '.cache/document-keywords/attributes.json')
 TEMPLATE_FILE = 'playbooks_keywords.rst.j2'
+CACHE_VERSION = 1
 PLAYBOOK_CLASS_NAMES = ['Play', 'Role', 'Block', 'Task']
 
 
 def load_definitions(keyword_definitions_file):
-    docs = {}
-    with open(keyword_definitions_file) as f:
-        docs = yaml.safe_load(f)
+    return load_yaml_file(keyword_definitions_file)
 
-    return docs
 
+def extract_playbook_attributes():
+    """
+    Return the public attributes of each playbook class as a list of ``(keyword, alias)`` pairs.
 
-def extract_keywords(keyword_definitions):
-    pb_keywords = {}
+    This imports the playbook classes from ansible-core, which pulls in most of ansible.
+    """
+    playbook_attributes = {}
     for pb_class_name in PLAYBOOK_CLASS_NAMES:
         if pb_class_name == 'Play':
             module_name = 'ansible.playbook'
@@ -49,23 +56,29 @@ def extract_keywords(keyword_definitions):
             raise ImportError("We weren't able to import the module {0}".format(module_name))
 
         # Maintain order of the actual class names for our output
-        # Build up a mapping of playbook classes to the attributes that they hold
-        pb_keywords[pb_class_name] = {k: v for (k, v) in playbook_class.fattributes.items()
-                                      # Filter private attributes as they're not usable in playbooks
-                                      if not v.private}
+        # Filter private attributes as they're not usable in playbooks
+        playbook_attributes[pb_class_name] = [(k, getattr(v, 'alias', None))
+                                              for (k, v) in playbook_class.fattributes.items()
+                                              if not v.private]
+
+    return playbook_attributes
+
+
+def merge_definitions(playbook_attributes, keyword_definitions):
+    """Build up a mapping of playbook classes to their keywords and the documentation of each keyword."""
+    pb_keywords = {}
+    for pb_class_name in PLAYBOOK_CLASS_NAMES:
+        pb_keywords[pb_class_name] = {}
 
         # pick up definitions if they exist
-        for keyword in tuple(pb_keywords[pb_class_name]):
+        for keyword, alias in playbook_attributes[pb_class_name]:
             if keyword in keyword_definitions:
                 pb_keywords[pb_class_name][keyword] = keyword_definitions[keyword]
-            else:
+            elif alias and alias in keyword_definitions:
                 # check if there is an alias, otherwise undocumented
-                alias = getattr(playbook_class.fattributes.get(keyword), 'alias', None)
-                if alias and alias in keyword_definitions:
-                    pb_keywords[pb_class_name][alias] = keyword_definitions[alias]
-                    del pb_keywords[pb_class_name][keyword]
-                else:
-                    pb_keywords[pb_class_name][keyword] = ' UNDOCUMENTED!! '
+                pb_keywords[pb_class_name][alias] = keyword_definitions[alias]
+            else:
+                pb_keywords[pb_class_name][keyword] = ' UNDOCUMENTED!! '
 
         # loop is really with_ for users
         if pb_class_name == 'Task':
@@ -81,13 +94,52 @@ def extract_keywords(keyword_definitions):
     return pb_keywords
 
 
+def extract_keywords(keyword_definitions):
+    return merge_definitions(extract_playbook_attributes(), keyword_definitions)
+
+
+def load_cached_attributes(cache_file, source_hash=None):
+    """
+    Return the playbook attributes stored in the cache file.
+
+    :arg source_hash: If given, only return the cached attributes if they were extracted from an ansible-core
+        source tree with this hash.  Returns None if the cache is missing, unreadable or stale.
+    """
+    try:
+        with open(cache_file) as f:
+            cache = json.load(f)
+    except (IOError, ValueError):
+        return None
+
+    if cache.get('version') != CACHE_VERSION:
+        return None
+
+    if source_hash is not None and cache.get('source_hash') != source_hash:
+        return None
+
+    return {pb_class_name: [tuple(attribute) for attribute in attributes]
+            for pb_class_name, attributes in cache['attributes'].items()}
+
+
+def store_cached_attributes(cache_file, source_hash, playbook_attributes):
+    data = json.dumps({'version': CACHE_VERSION, 'source_hash': source_hash, 'attributes': playbook_attributes},
+                      indent=2, sort_keys=True)
+    cache_dir = os.path.dirname(cache_file)
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+    update_file_if_different(cache_file, data.encode('utf-8'))
+
+
 def generate_page(pb_keywords, template_dir):
-    env = Environment(loader=FileSystemLoader(template_dir), trim_blocks=True,)
+    import jinja2
+
+    env = get_environment(template_dir, trim_blocks=True)
     template = env.get_template(TEMPLATE_FILE)
     tempvars = {'pb_keywords': pb_keywords, 'playbook_class_names': PLAYBOOK_CLASS_NAMES}
 
     keyword_page = template.render(tempvars)
-    if LooseVersion(jinja2.__version__) < LooseVersion('2.10'):
+    # Compare the version without ansible's LooseVersion so that rendering from the cache does not import ansible
+    if tuple(int(part) for part in re.findall(r'[0-9]+', jinja2.__version__)[:2]) < (2, 10):
         # jinja2 < 2.10's indent filter indents blank lines.  Cleanup
         keyword_page = re.sub(' +\n', '\n', keyword_page)
 
@@ -108,14 +160,51 @@ class DocumentKeywords(Command):
                             default='/tmp/', help="Output directory for rst files")
         parser.add_argument("keyword_defs", metavar="KEYWORD-DEFINITIONS.yml", type=str,
                             help="Source for playbook keyword docs")
+        parser.add_argument("--cache-file", action="store", dest="cache_file", default=DEFAULT_CACHE_FILE,
+                            help="File to cache the keywords extracted from ansible-core in.  The cache is reused"
+                            " until the ansible-core sources change.  (Default: %(default)s)")
+        parser.add_argument("--from-cache", action="store_true", dest="from_cache", default=False,
+                            help="Render the page from the cached keywords without importing ansible-core, even"
+                            " if the ansible-core sources changed since the cache was written.")
 
     @staticmethod
     def main(args):
+        outputname = os.path.join(args.output_dir, TEMPLATE_FILE.replace('.j2', ''))
+        template_file = os.path.join(args.template_dir, TEMPLATE_FILE)
+
+        if args.from_cache:
+            playbook_attributes = load_cached_attributes(args.cache_file)
+            if playbook_attributes is None:
+                raise MissingUserInput('No cached keywords found in {0}.  Run document-keywords without'
+                                       ' --from-cache first.'.format(args.cache_file))
+            fingerprint = get_input_fingerprint([args.keyword_defs, template_file, __file__, args.cache_file],
+                                                packages=('jinja2',))
+        else:
+            # The keywords themselves come from the playbook classes of ansible-core
+            release_file = ansible_core_release_file()
+            fingerprint = get_input_fingerprint([args.keyword_defs, template_file, __file__, release_file,
+                                                 release_file and os.path.join(os.path.dirname(release_file),
+                                                                               'playbook')],
+                                                packages=('jinja2',))
+            playbook_attributes = None
+
+        if output_is_current(outputname, fingerprint):
+            return 0
+
+        if playbook_attributes is None:
+            # Hashing all of lib/ansible is only worth it once the page needs to be rendered again
+            source_hash = get_input_fingerprint([release_file and os.path.dirname(release_file)])
+            playbook_attributes = load_cached_attributes(args.cache_file, source_hash)
+
+            if playbook_attributes is None:
+                playbook_attributes = extract_playbook_attributes()
+                store_cached_attributes(args.cache_file, source_hash, playbook_attributes)
+
         keyword_definitions = load_definitions(args.keyword_defs)
-        pb_keywords = extract_keywords(keyword_definitions)
+        pb_keywords = merge_definitions(playbook_attributes, keyword_definitions)
 
         keyword_page = generate_page(pb_keywords, args.template_dir)
-        outputname = os.path.join(args.output_dir, TEMPLATE_FILE.replace('.j2', ''))
-        update_file_if_different(outputname, to_bytes(keyword_page))
+        update_file_if_different(outputname, keyword_page.encode('utf-8'))
+        record_output_fingerprint(outputname, fingerprint)
 
         return 0
@@ -0,0 +1,363 @@
+# coding: utf-8
+# Copyright: (c) 2024, Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import argparse
+import concurrent.futures
+import dataclasses
+import hashlib
+import importlib
+import importlib.metadata
+import json
+import os
+import os.path
+import pathlib
+import subprocess
+import sys
+import typing as t
+
+# Pylint doesn't understand Python3 namespace modules.
+from ..commands import Command  # pylint: disable=relative-beyond-top-level
+from ..errors import InvalidUserInput  # pylint: disable=relative-beyond-top-level
+
+
+DEFAULT_TOP_DIR = pathlib.Path(__file__).parents[4]
+DEFAULT_DOCSITE_DIR = DEFAULT_TOP_DIR / 'docs/docsite'
+STATE_FILE = '.generate-all-state.json'
+# Names of the plugin rst stages, docs-build drops their state when it writes plugin rst itself
+PLUGIN_STAGES = ('plugins', 'core_plugins')
+
+
+@dataclasses.dataclass(frozen=True)
+class Stage:
+    """
+    A single rst generation step.
+
+    Stages either run a build-ansible.py command, given as ``module:Class``, in a worker process, or an external script.
+    Stages without inputs are always run; the others are skipped when their inputs are unchanged since the last run.
+    A stage which reads the outputs of others lists them in ``depends_on``; the current stages are all independent.
+    """
+    name: str
+    argv: tuple[str, ...]
+    outputs: tuple[str, ...]
+    command: t.Optional[str] = None
+    script: t.Optional[str] = None
+    inputs: t.Optional[tuple[str, ...]] = None
+    packages: tuple[str, ...] = ()
+    depends_on: tuple[str, ...] = ()
+
+
+def get_stages(args):
+    """Return the generation stages of the Makefile's generate_rst (or core_generate_rst) target."""
+    top_dir = os.path.abspath(str(args.top_dir))
+    docsite_dir = os.path.abspath(str(args.docsite_dir))
+    rst_dir = os.path.join(docsite_dir, 'rst')
+    templates_dir = os.path.join(docsite_dir, '..', 'templates')
+    plugins_dir = os.path.dirname(__file__)
+    library_dir = os.path.dirname(plugins_dir)
+
+    def template(name):
+        return os.path.normpath(os.path.join(templates_dir, name))
+
+    def helpers(*names):
+        # The build_ansible modules a command uses besides its own, changes to them affect its output too.
+        return tuple(os.path.join(library_dir, f'{name}.py') for name in names)
+
+    stages = [
+        Stage(
+            name='collections_meta',
+            command='build_ansible.command_plugins.collection_meta:DocumentCollectionMeta',
+            argv=('--template-file', template('collections_galaxy_meta.rst.j2'),
+                  '--output-dir', os.path.join(rst_dir, 'dev_guide'),
+                  os.path.join(top_dir, 'lib/ansible/galaxy/data/collections_galaxy_meta.yml')),
+            inputs=(template('collections_galaxy_meta.rst.j2'),
+                    os.path.join(top_dir, 'lib/ansible/galaxy/data/collections_galaxy_meta.yml'),
+                    os.path.join(plugins_dir, 'collection_meta.py'))
+                   + helpers('change_detection', 'templating', 'yaml_loader'),
+            packages=('antsibull-docs', 'jinja2'),
+            outputs=(os.path.join(rst_dir, 'dev_guide/collections_galaxy_meta.rst'),),
+        ),
+        Stage(
+            name='config',
+            command='build_ansible.command_plugins.dump_config:DocumentConfig',
+            argv=('--template-file', template('config.rst.j2'),
+                  '--output-dir', os.path.join(rst_dir, 'reference_appendices'),
+                  os.path.join(top_dir, 'lib/ansible/config/base.yml')),
+            inputs=(template('config.rst.j2'),
+                    os.path.join(top_dir, 'lib/ansible/config/base.yml'),
+                    os.path.join(plugins_dir, 'dump_config.py'))
+                   + helpers('change_detection', 'templating', 'yaml_loader'),
+            packages=('jinja2',),
+            outputs=(os.path.join(rst_dir, 'reference_appendices/config.rst'),),
+        ),
+        Stage(
+            name='cli',
+            script=os.path.join(top_dir, 'packaging/cli-doc/build.py'),
+            argv=('rst', '--output-dir', os.path.join(rst_dir, 'cli')),
+            inputs=(os.path.join(top_dir, 'packaging/cli-doc'),
+                    os.path.join(top_dir, 'lib/ansible/cli')),
+            outputs=(os.path.join(rst_dir, 'cli'),),
+        ),
+        Stage(
+            name='keywords',
+            command='build_ansible.command_plugins.dump_keywords:DocumentKeywords',
+            argv=('--template-dir', os.path.normpath(templates_dir),
+                  '--output-dir', os.path.join(rst_dir, 'reference_appendices'),
+                  os.path.join(top_dir, 'lib/ansible/keyword_desc.yml')),
+            inputs=(template('playbooks_keywords.rst.j2'),
+                    os.path.join(top_dir, 'lib/ansible/keyword_desc.yml'),
+                    os.path.join(top_dir, 'lib/ansible/playbook'),
+                    os.path.join(plugins_dir, 'dump_keywords.py'))
+                   + helpers('change_detection', 'templating', 'yaml_loader'),
+            packages=('jinja2',),
+            outputs=(os.path.join(rst_dir, 'reference_appendices/playbooks_keywords.rst'),),
+        ),
+    ]
+
+    plugin_argv = [args.plugins, '--output-dir', rst_dir, '--top-dir', top_dir]
+    if args.ansible_version:
+        plugin_argv.extend(['--ansible-version', args.ansible_version])
+
+    stages.append(Stage(
+        name=PLUGIN_STAGES[0] if args.plugins == 'full' else PLUGIN_STAGES[1],
+        command='build_ansible.command_plugins.docs_build:CollectionPluginDocs',
+        argv=tuple(plugin_argv),
+        # The full build pulls the collections to document from the network, so it cannot be skipped.
+        inputs=(os.path.join(top_dir, 'lib/ansible'),
+                os.path.join(plugins_dir, 'docs_build.py'))
+               + helpers('change_detection') if args.plugins == 'core' else None,
+        packages=('antsibull-docs',),
+        outputs=(os.path.join(rst_dir, 'collections'),),
+    ))
+
+    return stages
+
+
+def get_fingerprint(stage):
+    """
+    Fingerprint the stage's arguments, the versions of its packages and the size and modification time of all of
+    its input files.
+
+    Returns None for stages without inputs, which are always run.
+    """
+    if stage.inputs is None:
+        return None
+
+    digest = hashlib.sha256()
+    digest.update(json.dumps([stage.command, stage.script, stage.argv]).encode('utf-8'))
+
+    for package in stage.packages:
+        try:
+            digest.update(importlib.metadata.version(package).encode('utf-8'))
+        except importlib.metadata.PackageNotFoundError:
+            pass
+
+    for input_path in stage.inputs:
+        for path in sorted(iter_files(input_path)):
+            try:
+                path_stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+
+            digest.update(f'{path}\0{path_stat.st_size}\0{path_stat.st_mtime_ns}\0'.encode('utf-8'))
+
+    return digest.hexdigest()
+
+
+def iter_files(path):
+    """Yield the path itself if it is a file, or all files below it if it is a directory."""
+    if not os.path.isdir(path):
+        yield path
+        return
+
+    for root, dir_names, file_names in os.walk(path):
+        dir_names[:] = [name for name in dir_names if name != '__pycache__']
+
+        for file_name in file_names:
+            yield os.path.join(root, file_name)
+
+
+def run_stage(stage):
+    """Run a stage, this is called in a worker process."""
+    if stage.script:
+        return subprocess.run([sys.executable, stage.script, *stage.argv], check=False).returncode
+
+    module_name, class_name = stage.command.split(':')
+    command = getattr(importlib.import_module(module_name), class_name)
+
+    parser = argparse.ArgumentParser(prog=f'generate-all {stage.name}')
+    command.init_parser(parser.add_subparsers(dest='command').add_parser)
+    args = parser.parse_args([command.name, *stage.argv])
+
+    return command.main(args) or 0
+
+
+def forget_stages(docsite_dir, names):
+    """Drop the recorded fingerprints of the named stages from the state in docsite_dir, so they run next time."""
+    state_file = os.path.join(str(docsite_dir), STATE_FILE)
+
+    try:
+        with open(state_file) as f:
+            state = json.load(f)
+    except (IOError, ValueError):
+        return
+
+    if not any(name in state for name in names):
+        return
+
+    for name in names:
+        state.pop(name, None)
+
+    with open(state_file, 'w') as f:
+        json.dump(state, f, indent=4, sort_keys=True)
+
+
+def check_dependencies(stages):
+    """Raise ValueError if a stage depends on a stage which does not exist, or the stages depend on each other in a cycle."""
+    by_name = {stage.name: stage for stage in stages}
+
+    for stage in stages:
+        for dep in stage.depends_on:
+            if dep not in by_name:
+                raise ValueError(f'Stage {stage.name} depends on unknown stage {dep}')
+
+    ordered = set()
+    remaining = dict(by_name)
+
+    while remaining:
+        ready = [name for name, stage in remaining.items() if all(dep in ordered for dep in stage.depends_on)]
+
+        if not ready:
+            raise ValueError('Stages depend on each other in a cycle: {0}'.format(', '.join(sorted(remaining))))
+
+        for name in ready:
+            ordered.add(name)
+            del remaining[name]
+
+
+def run_graph(stages, jobs, state):
+    """
+    Run the stages in a process pool, starting each one as soon as the stages it depends on have finished.
+
+    Stages whose fingerprint matches the one recorded in ``state`` are skipped; ``state`` is updated for the stages that succeed.
+    Returns the names of the stages that failed or could not run because a dependency failed.
+    """
+    check_dependencies(stages)
+
+    pending = {stage.name: stage for stage in stages}
+    fingerprints = {stage.name: get_fingerprint(stage) for stage in stages}
+    done = set()
+    failed = []
+    running = {}
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        while pending or running:
+            for name, stage in list(pending.items()):
+                if any(dep in failed for dep in stage.depends_on):
+                    print(f'{name}: not run, a stage it depends on failed')
+                    failed.append(name)
+                    del pending[name]
+                elif all(dep in done for dep in stage.depends_on):
+                    del pending[name]
+
+                    fingerprint = fingerprints[name]
+                    if (fingerprint is not None and state.get(name) == fingerprint
+                            and all(os.path.exists(output) for output in stage.outputs)):
+                        print(f'{name}: inputs unchanged, skipping')
+                        done.add(name)
+                        continue
+
+                    print(f'{name}: running')
+                    running[executor.submit(run_stage, stage)] = stage
+
+            if not running:
+                continue
+
+            finished, dummy = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+
+            for future in finished:
+                stage = running.pop(future)
+
+                try:
+                    retval = future.result()
+                except Exception as e:  # pylint: disable=broad-except
+                    print(f'{stage.name}: failed: {e}')
+                    retval = 1
+                else:
+                    if retval:
+                        print(f'{stage.name}: failed: exit code {retval}')
+
+                if retval:
+                    failed.append(stage.name)
+                    state.pop(stage.name, None)
+                    continue
+
+                print(f'{stage.name}: done')
+                done.add(stage.name)
+
+                if fingerprints[stage.name] is not None:
+                    state[stage.name] = fingerprints[stage.name]
+
+    return failed
+
+
+class GenerateAll(Command):
+    name = 'generate-all'
+
+    @classmethod
+    def init_parser(cls, add_parser):
+        parser = add_parser(cls.name, description='Run all rst generation steps of the docs build, running independent'
+                            ' steps in parallel and skipping steps whose inputs have not changed since the last run.')
+        parser.add_argument('--plugins', action='store', choices=('full', 'core'), default='core',
+                            help='Generate the plugin rst for the full ansible website or for ansible-core only.'
+                            ' (Default: %(default)s)')
+        parser.add_argument('-j', '--jobs', action='store', type=int, default=None,
+                            help='Maximum number of steps to run at the same time. (Default: number of CPUs)')
+        parser.add_argument('--docsite-dir', action='store', dest='docsite_dir', default=DEFAULT_DOCSITE_DIR,
+                            help='The docs/docsite directory to generate rst in.')
+        parser.add_argument('-t', '--top-dir', action='store', dest='top_dir', default=DEFAULT_TOP_DIR,
+                            help='Toplevel directory of this ansible-core checkout or expanded tarball.')
+        parser.add_argument('--ansible-version', action='store', dest='ansible_version', default=None,
+                            help='The version of the ansible package to make documentation for.'
+                            '  This only makes sense when used with --plugins=full.')
+        parser.add_argument('--force', action='store_true', default=False,
+                            help='Run all steps, even when their inputs have not changed.')
+
+    @staticmethod
+    def main(args):
+        if args.ansible_version and args.plugins != 'full':
+            raise InvalidUserInput('--ansible-version is only for use with --plugins=full.')
+
+        if args.jobs is None:
+            args.jobs = os.cpu_count() or 1
+
+        if args.jobs < 1:
+            raise InvalidUserInput('--jobs must be at least 1.')
+
+        state_file = os.path.join(str(args.docsite_dir), STATE_FILE)
+        state = {}
+
+        if not args.force:
+            try:
+                with open(state_file) as f:
+                    state = json.load(f)
+            except (IOError, ValueError):
+                state = {}
+
+        # Flush before forking so buffered output is not duplicated by the workers.
+        sys.stdout.flush()
+
+        failed = run_graph(get_stages(args), args.jobs, state)
+
+        with open(state_file, 'w') as f:
+            json.dump(state, f, indent=4, sort_keys=True)
+
+        if failed:
+            print('Failed steps: {0}'.format(', '.join(failed)))
+            return 1
+
+        return 0
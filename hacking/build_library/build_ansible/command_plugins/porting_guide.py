@@ -7,10 +7,11 @@ from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
 
 
-from jinja2 import Environment, DictLoader
+from jinja2 import DictLoader
 
 # Pylint doesn't understand Python3 namespace modules.
 from ..commands import Command  # pylint: disable=relative-beyond-top-level
+from ..templating import get_environment  # pylint: disable=relative-beyond-top-level
 
 
 PORTING_GUIDE_TEMPLATE = """
@@ -96,7 +97,7 @@ No notable changes
 # jinja2 is horrid about getting rid of extra newlines so we have to have a single line per
 # paragraph for proper wrapping to occur
 
-JINJA_ENV = Environment(
+JINJA_ENV = get_environment(
     loader=DictLoader({'porting_guide': PORTING_GUIDE_TEMPLATE,
                        }),
     extensions=['jinja2.ext.i18n'],
@@ -0,0 +1,139 @@
+# coding: utf-8
+# Copyright: (c) 2024, Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""
+Cache of the available subcommands so that only the plugin being run has to be imported.
+
+The manifest records, for each :class:`~build_ansible.commands.Command`, the module it lives in and the
+arguments its ``init_parser`` adds.  The command line parser is rebuilt from the manifest and only the module of
+the selected subcommand is imported.  The manifest is regenerated whenever a plugin file changes.
+"""
+
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import dataclasses
+import importlib
+import os
+import os.path
+import pickle
+import sys
+import tempfile
+import typing as t
+
+
+MANIFEST_FILE = 'build-ansible-commands.pickle'
+MANIFEST_VERSION = 1
+
+
+@dataclasses.dataclass
+class CommandSpec:
+    """A subcommand recorded in the manifest."""
+    name: str
+    module: str
+    class_name: str
+    # (add_parser args, add_parser kwargs, [(add_argument args, add_argument kwargs), ...]), or None if the
+    # parser could not be recorded, in which case the module is imported to set up its parser.
+    parser: t.Optional[tuple]
+
+    def load(self):
+        """Import the plugin module and return the Command class."""
+        return getattr(importlib.import_module(self.module), self.class_name)
+
+    def init_parser(self, add_parser):
+        """Register the subcommand's parser like Command.init_parser does."""
+        if self.parser is None:
+            self.load().init_parser(add_parser)
+            return
+
+        args, kwargs, arguments = self.parser
+        parser = add_parser(*args, **kwargs)
+        for arg_args, arg_kwargs in arguments:
+            parser.add_argument(*arg_args, **arg_kwargs)
+
+
+class _RecordingParser:
+    """Stands in for an ArgumentParser and records the arguments added to it."""
+
+    def __init__(self):
+        self.arguments = []
+
+    def add_argument(self, *args, **kwargs):
+        self.arguments.append((args, kwargs))
+
+
+def record_command(command):
+    """
+    Return a CommandSpec for a Command class.
+
+    Only parsers built with plain ``add_argument`` calls and picklable values can be recorded.
+    """
+    recorded = []
+
+    def add_parser(*args, **kwargs):
+        parser = _RecordingParser()
+        recorded.append((args, kwargs, parser))
+        return parser
+
+    try:
+        command.init_parser(add_parser)
+        (args, kwargs, parser), = recorded
+        spec = (args, kwargs, parser.arguments)
+        pickle.dumps(spec)
+    except (AttributeError, TypeError, ValueError, pickle.PicklingError):
+        spec = None
+
+    return CommandSpec(name=command.name, module=command.__module__, class_name=command.__qualname__, parser=spec)
+
+
+def _package_dirs(package):
+    return list(importlib.import_module(package).__path__)
+
+
+def _fingerprint(package):
+    """Identify the current state of the plugin files, and the Python version the manifest was pickled with."""
+    files = []
+
+    for package_dir in _package_dirs(package):
+        for file_name in sorted(os.listdir(package_dir)):
+            if not file_name.endswith('.py'):
+                continue
+
+            file_stat = os.stat(os.path.join(package_dir, file_name))
+            files.append((package_dir, file_name, file_stat.st_size, file_stat.st_mtime_ns))
+
+    return (MANIFEST_VERSION, tuple(sys.version_info), tuple(files))
+
+
+def _manifest_path(package):
+    return os.path.join(_package_dirs(package)[0], '__pycache__', MANIFEST_FILE)
+
+
+def load_manifest(package):
+    """Return the list of CommandSpecs for the plugins in package, or None if there is no up to date manifest."""
+    try:
+        with open(_manifest_path(package), 'rb') as f:
+            fingerprint, specs = pickle.load(f)
+    except Exception:  # pylint: disable=broad-except
+        # A missing, truncated or otherwise unreadable manifest is simply regenerated.
+        return None
+
+    if fingerprint != _fingerprint(package):
+        return None
+
+    return specs
+
+
+def save_manifest(package, specs):
+    """Write the manifest for the plugins in package.  Failing to write it is not an error."""
+    manifest_path = _manifest_path(package)
+
+    try:
+        os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+        with tempfile.NamedTemporaryFile('wb', dir=os.path.dirname(manifest_path), delete=False) as f:
+            pickle.dump((_fingerprint(package), specs), f)
+        os.replace(f.name, manifest_path)
+    except OSError:
+        pass
@@ -0,0 +1,92 @@
+# coding: utf-8
+# Copyright: (c) 2024, Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""
+Jinja2 environments for the docs generators.
+
+All environments share a bytecode cache on disk so that templates are only compiled once, rather than on every
+run of a generator.  The cache directory defaults to ``.cache/jinja2`` in the top of the checkout and can be
+changed with the ``BUILD_ANSIBLE_TEMPLATE_CACHE`` environment variable.  Setting it to an empty value disables
+the cache.  The directory is only created when the first template is compiled, and templates are simply not
+cached when it cannot be written to.
+"""
+
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import functools
+import hashlib
+import os
+import pathlib
+
+
+DEFAULT_CACHE_DIR = str(pathlib.Path(__file__).resolve().parents[3] / '.cache/jinja2')
+
+# Environment settings which change how a template compiles.  jinja2 only keys its bytecode cache on the
+# template name and source, so these are added to the cache file names.
+_COMPILE_SETTINGS = ('block_start_string', 'block_end_string', 'variable_start_string', 'variable_end_string',
+                     'comment_start_string', 'comment_end_string', 'line_statement_prefix',
+                     'line_comment_prefix', 'trim_blocks', 'lstrip_blocks', 'newline_sequence',
+                     'keep_trailing_newline', 'optimized')
+
+
+def get_cache_dir():
+    """Return the directory to store compiled templates in, or None if the cache is disabled."""
+    return os.environ.get('BUILD_ANSIBLE_TEMPLATE_CACHE', DEFAULT_CACHE_DIR) or None
+
+
+@functools.lru_cache(maxsize=None)
+def _get_bytecode_cache_class():
+    from jinja2 import FileSystemBytecodeCache
+
+    class LazyBytecodeCache(FileSystemBytecodeCache):
+        """A FileSystemBytecodeCache which creates its directory on first write and ignores errors writing to it."""
+
+        def dump_bytecode(self, bucket):
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                super(LazyBytecodeCache, self).dump_bytecode(bucket)
+            except OSError:
+                pass
+
+    return LazyBytecodeCache
+
+
+def use_bytecode_cache(env):
+    """
+    Make an existing jinja2 Environment use the shared bytecode cache.
+
+    This is for environments created elsewhere, for instance by antsibull-docs.
+
+    :arg env: The jinja2 Environment
+    :returns: The same Environment
+    """
+    cache_dir = get_cache_dir()
+    if cache_dir is None:
+        return env
+
+    settings = [repr(getattr(env, name, None)) for name in _COMPILE_SETTINGS]
+    settings.extend(sorted(env.extensions))
+    settings_hash = hashlib.sha256('\0'.join(settings).encode('utf-8')).hexdigest()[:16]
+
+    env.bytecode_cache = _get_bytecode_cache_class()(cache_dir, '__jinja2_{0}_%s.cache'.format(settings_hash))
+
+    return env
+
+
+def get_environment(template_dir=None, loader=None, **kwargs):
+    """
+    Create a jinja2 Environment which uses the shared bytecode cache.
+
+    :kwarg template_dir: Directory to load templates from.  Ignored if ``loader`` is given
+    :kwarg loader: The jinja2 loader to use
+    :kwarg kwargs: Any other settings for the Environment
+    """
+    from jinja2 import Environment, FileSystemLoader
+
+    if loader is None:
+        loader = FileSystemLoader(template_dir)
+
+    return use_bytecode_cache(Environment(loader=loader, **kwargs))
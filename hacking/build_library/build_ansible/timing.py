@@ -0,0 +1,89 @@
+# coding: utf-8
+# Copyright: (c) 2024, Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""Timing helpers behind build-ansible.py's ``--timings`` option."""
+
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import builtins
+import contextlib
+import importlib.util
+import sys
+import time
+
+
+class PhaseTimer:
+    """Accumulates the wall time spent in named phases of a run, in the order they were first entered."""
+
+    def __init__(self):
+        self.phases = {}
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def report(self, file=sys.stderr):
+        print('Phase timings:', file=file)
+        for name, elapsed in self.phases.items():
+            print('  {0:<24} {1:>9.3f}s'.format(name, elapsed), file=file)
+
+
+class ImportTimer:
+    """
+    Records how long each newly imported module took to import by wrapping ``builtins.__import__``.
+
+    Like ``python -X importtime``, both the cumulative time, which includes the modules it imported in turn, and
+    the time spent in the module itself are recorded.  Modules imported with ``importlib.import_module`` are only
+    seen through the imports they make themselves.
+    """
+
+    def __init__(self):
+        self.times = {}
+        self._stack = []
+        self._original_import = None
+
+    def install(self):
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._import
+
+    def uninstall(self):
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level:
+            try:
+                module_name = importlib.util.resolve_name('.' * level + name, (globals or {}).get('__package__'))
+            except (ImportError, ValueError):
+                module_name = name
+        else:
+            module_name = name
+
+        if module_name in sys.modules:
+            return self._original_import(name, globals, locals, fromlist, level)
+
+        start = time.perf_counter()
+        self._stack.append(0.0)
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            nested = self._stack.pop()
+            elapsed = time.perf_counter() - start
+            if module_name in sys.modules:
+                self.times[module_name] = (elapsed, elapsed - nested)
+            if self._stack:
+                self._stack[-1] += elapsed
+
+    def report(self, count=15, file=sys.stderr):
+        print('Slowest imports (cumulative / self):', file=file)
+        slowest = sorted(self.times.items(), key=lambda item: item[1][0], reverse=True)[:count]
+        for module_name, (cumulative, own) in slowest:
+            print('  {0:<48} {1:>9.3f}s {2:>9.3f}s'.format(module_name, cumulative, own), file=file)
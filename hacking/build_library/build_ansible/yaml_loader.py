@@ -0,0 +1,70 @@
+# coding: utf-8
+# Copyright: (c) 2024, Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""
+YAML loading for the docs generators.
+
+Files are parsed with libyaml's CSafeLoader when PyYAML was built with it, falling back to the much slower
+pure-Python SafeLoader otherwise.  Parsed documents are cached by path and modification time for the life of the
+process, so a batch run which reads the same file several times only parses it once.
+"""
+
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import copy
+import os
+import os.path
+import sys
+
+
+_CACHE = {}
+_REPORTED = False
+
+
+def get_loader():
+    """Return the fastest safe YAML loader class available."""
+    import yaml
+
+    return getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+def loader_name():
+    """Return the name of the loader :func:`load_yaml_file` uses, ``CSafeLoader`` or ``SafeLoader``."""
+    return get_loader().__name__
+
+
+def _report_loader():
+    global _REPORTED
+
+    if not _REPORTED and loader_name() != 'CSafeLoader':
+        print('libyaml is not available, parsing YAML with the pure-Python SafeLoader', file=sys.stderr)
+    _REPORTED = True
+
+
+def load_yaml_file(path):
+    """
+    Parse a YAML file.
+
+    :arg path: The file to load
+    :returns: The parsed document.  Callers get their own copy which they may modify.
+    """
+    import yaml
+
+    path = os.path.abspath(path)
+    path_stat = os.stat(path)
+    key = (path, path_stat.st_size, path_stat.st_mtime_ns)
+
+    if key not in _CACHE:
+        _report_loader()
+        with open(path, 'rb') as f:
+            _CACHE[key] = yaml.load(f, Loader=get_loader())  # nosec - the loader is always a safe loader
+
+    return copy.deepcopy(_CACHE[key])
+
+
+def clear_cache():
+    """Forget all parsed documents."""
+    _CACHE.clear()
@@ -0,0 +1,89 @@
+# coding: utf-8
+# Copyright: (c) 2026, Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+"""
+Tests for the incremental plugin rst builds of docs-build.
+
+Run with ``python -m unittest discover -s hacking/build_library/tests`` in an environment with ansible-core.
+"""
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import os
+import os.path
+import sys
+import unittest
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from build_ansible.command_plugins import docs_build  # noqa: E402
+
+
+class IncrementalBuildTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp_dir = TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+
+        self.top_dir = os.path.join(tmp_dir.name, 'core')
+        os.makedirs(os.path.join(self.top_dir, 'lib', 'ansible'))
+        with open(os.path.join(self.top_dir, 'lib', 'ansible', 'release.py'), 'w') as f:
+            f.write("__version__ = '2.99.0'\n")
+
+        self.output_dir = os.path.join(tmp_dir.name, 'docsite', 'rst')
+        self.descriptions = {'ansible.builtin.copy': 'Copy files', 'community.general.foo': 'Manage foo',
+                             'community.crypto.bar': 'Manage bar'}
+        self.runs = 0
+
+    def fake_antsibull_docs(self, params, cwd, top_dir, output_dir):
+        """Write the pages antsibull-docs would write for self.descriptions."""
+        self.runs += 1
+        index = []
+        for plugin, description in sorted(self.descriptions.items()):
+            namespace, name, plugin_name = plugin.split('.')
+            plugin_dir = os.path.join(output_dir, 'collections', namespace, name)
+            os.makedirs(plugin_dir, exist_ok=True)
+            with open(os.path.join(plugin_dir, plugin_name + '_module.rst'), 'w') as f:
+                f.write('{0} -- {1}\n'.format(plugin, description))
+            index.append('* :ansplugin:`{0}#module` -- {1}\n'.format(plugin, description))
+
+        with open(os.path.join(output_dir, 'collections', 'index_module.rst'), 'w') as f:
+            f.writelines(index)
+        with open(os.path.join(output_dir, 'collections', 'environment_variables.rst'), 'w') as f:
+            f.write('Environment variables\n')
+        return 0
+
+    def build(self, deps_data):
+        with mock.patch.object(docs_build, 'run_antsibull_docs', self.fake_antsibull_docs):
+            return docs_build.run_antsibull_docs_incremental(['stable'], None, self.top_dir, self.output_dir,
+                                                            deps_data, {'action': 'core'})
+
+    def read_index(self):
+        with open(os.path.join(self.output_dir, 'collections', 'index_module.rst')) as f:
+            return f.read()
+
+    def test_unchanged_versions_skip_antsibull_docs(self):
+        deps_data = {'_ansible_version': '11.0.0', 'community.general': '10.0.0', 'community.crypto': '2.0.0'}
+        self.assertEqual(self.build(deps_data), 0)
+        self.assertEqual(self.build(deps_data), 0)
+        self.assertEqual(self.runs, 1)
+
+    def test_changed_description_updates_indexes(self):
+        deps_data = {'_ansible_version': '11.0.0', 'community.general': '10.0.0', 'community.crypto': '2.0.0'}
+        self.assertEqual(self.build(deps_data), 0)
+
+        # A new collection version that only changes a short description, not the list of plugins
+        self.descriptions['community.general.foo'] = 'Manage foo (deprecated)'
+        self.assertEqual(self.build(dict(deps_data, **{'community.general': '10.1.0'})), 0)
+
+        self.assertEqual(self.runs, 2)
+        self.assertIn('Manage foo (deprecated)', self.read_index())
+        with open(os.path.join(self.output_dir, 'collections', 'community', 'general', 'foo_module.rst')) as f:
+            self.assertIn('Manage foo (deprecated)', f.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
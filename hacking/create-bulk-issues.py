@@ -14,14 +14,13 @@ import subprocess
 import sys
 import typing as t
 
-import yaml
-
 try:
     # noinspection PyPackageRequirements
     import argcomplete
 except ImportError:
     argcomplete = None
 
+from ansible.module_utils.common.yaml import yaml_load
 from ansible.release import __version__
 
 MAJOR_MINOR_VERSION = '.'.join(__version__.split('.')[:2])
@@ -390,7 +389,7 @@ def deprecated_command(args: DeprecationArgs) -> None:
 
 def feature_command(args: FeatureArgs) -> None:
     with args.source.open() as source_file:
-        source = yaml.safe_load(source_file)
+        source = yaml_load(source_file)
 
     default: dict[str, t.Any] = source.get('default', {})
     features: list[dict[str, t.Any]] = source.get('features', [])
@@ -267,6 +267,16 @@ def make(session: nox.Session):
     session.run("make", "-C", "docs/docsite", *make_args, external=True)
 
 
+@nox.session
+def benchmark(session: nox.Session):
+    """
+    Benchmark the stages of the core docs build against the cloned ansible-core
+    """
+    install(session, req="requirements")
+    _clone_core_check(session)
+    session.run("python", "docs/bin/benchmark-docs-build.py", *session.posargs)
+
+
 @nox.session
 def tag(session: nox.Session):
     """
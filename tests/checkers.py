@@ -4,35 +4,80 @@
 from __future__ import annotations
 
 import argparse
+import collections.abc
+import concurrent.futures
+import dataclasses
+import heapq
 import json
 import os
 import pathlib
+import re
 import subprocess
 import sys
+import time
 
 
 ROOT = pathlib.Path(__file__).resolve().parent.parent
 
+FINDING_PATTERN = re.compile(r'^(?P<path>[^:]+):(?P<line>[0-9]+):(?P<column>[0-9]+): (?P<message>.*)$')
+INCLUDE_PATTERN = re.compile(r'^\s*\.\.\s+(?:literal)?include::\s*(?P<target>\S.*?)\s*$', re.MULTILINE)
+
+# Sphinx resolves absolute include paths relative to the source directory.
+SOURCE_DIR = ROOT / 'docs' / 'docsite' / 'rst'
+
+SARIF_SCHEMA = 'https://json.schemastore.org/sarif-2.1.0.json'
+
+
+@dataclasses.dataclass
+class CheckerRun:
+    """Output and resource usage of a single checker process."""
+    returncode: int
+    stdout: str
+    stderr: str
+    cpu_time: float | None = None
+    max_rss: int | None = None
+
 
 def main() -> None:
     parser = argparse.ArgumentParser()
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='split the checked paths into this many shards and run them in parallel, at most one per CPU. '
+                             'The CPUs are divided between the shards, so this only helps checkers which run on a single core; '
+                             'rstcheck already checks files on all CPUs, which is why the default is %(default)s')
+    parser.add_argument('--changed-since', metavar='REF',
+                        help='only check files changed since this git ref, and the files which include them')
+    parser.add_argument('--report', metavar='FILE',
+                        help='write the findings, timings and resource usage of each checker to this file')
+    parser.add_argument('--format', choices=('json', 'sarif'), default='json',
+                        help='format of the --report file (default: %(default)s)')
     parser.add_argument('test', nargs='+')
 
     args = parser.parse_args()
     tests: list[str] = args.test
     failed = False
+    report: list[dict] = []
+
+    if args.jobs < 1:
+        parser.error('--jobs must be at least 1')
+
+    changed = get_changed_paths(args.changed_since) if args.changed_since else None
 
     for test in tests:
-        if run_test(test):
+        if run_test(test, jobs=args.jobs, changed=changed, report=report):
             failed = True
 
+    if args.report:
+        write_report(args.report, args.format, report)
+
     if failed:
         sys.exit(1)
 
 
-def run_test(name: str) -> bool:
+def run_test(name: str, jobs: int = 1, changed: set[str] | None = None, report: list[dict] | None = None) -> bool:
     print(f'Running {name!r} checker ...', file=sys.stderr, flush=True)
 
+    start = time.perf_counter()
+
     checker_path = ROOT / 'tests' / 'checkers' / f'{name}.py'
     checker_json = checker_path.with_suffix('.json')
 
@@ -52,18 +97,243 @@ def run_test(name: str) -> bool:
             if ext in extensions:
                 paths.append(path)
 
-    cmd = [sys.executable, checker_path] + paths
+    if changed is not None and extensions:
+        paths = find_affected_paths(paths, changed)
 
-    try:
-        result = subprocess.run(cmd, check=True, capture_output=True, text=True)
-    except subprocess.CalledProcessError as ex:
-        print(ex, file=sys.stderr, flush=True)
-        result = ex
+        if not paths:
+            print(f'No files changed for {name!r} checker, skipping.', file=sys.stderr, flush=True)
+
+            if report is not None:
+                report.append(dict(name=name, skipped=True, failed=False, exit_codes=[], files=0, shards=0, wall_time=0.0, cpu_time=0.0,
+                                   max_rss=0, findings=[], stderr=''))
+
+            return False
+
+    cpu_count = os.cpu_count() or 1
+    shards = shard_paths(paths, min(jobs, cpu_count))
+
+    if len(shards) == 1:
+        results = [run_checker(checker_path, shards[0])]
+    else:
+        # Checkers with their own worker pools only get their share of the CPUs, so the shards do not oversubscribe them.
+        cpus = max(1, cpu_count // len(shards))
+
+        # Each shard runs in its own checker process, the threads only wait on them.
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(shards)) as executor:
+            results = list(executor.map(lambda shard: run_checker(checker_path, shard, cpus=cpus), shards))
+
+    stdout = merge_output(result.stdout for result in results)
+    stderr = ''.join(result.stderr for result in results)
+
+    sys.stdout.write(stdout)
+    sys.stderr.write(stderr)
+
+    failed = bool(stdout or stderr)
+
+    if report is not None:
+        cpu_times = [result.cpu_time for result in results]
+        max_rss = [result.max_rss for result in results]
+
+        report.append(dict(
+            name=name,
+            skipped=False,
+            failed=failed,
+            exit_codes=[result.returncode for result in results],
+            files=len(paths),
+            shards=len(shards),
+            wall_time=time.perf_counter() - start,
+            cpu_time=None if None in cpu_times else sum(cpu_times),
+            max_rss=None if None in max_rss else max(max_rss),
+            findings=[parse_finding(line) for line in stdout.splitlines()],
+            stderr=stderr,
+        ))
+
+    return failed
+
+
+def run_checker(checker_path: pathlib.Path, paths: list[str], cpus: int | None = None) -> CheckerRun:
+    """
+    Run the checker over the given paths and return its output and resource usage.
+
+    When `cpus` is given, the checker is told through the CHECKER_CPUS environment variable how many CPUs it may use.
+    """
+    cmd = [sys.executable, str(checker_path)] + paths
+    env = dict(os.environ, CHECKER_CPUS=str(cpus)) if cpus else None
+
+    if not hasattr(os, 'wait4'):
+        process = subprocess.run(cmd, check=False, capture_output=True, text=True, env=env)
+        result = CheckerRun(returncode=process.returncode, stdout=process.stdout, stderr=process.stderr)
+    else:
+        with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, env=env) as process:
+            # Read both pipes to the end without reaping the process, so wait4 can collect its resource usage.
+            with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+                stdout = executor.submit(process.stdout.read)
+                stderr = executor.submit(process.stderr.read)
+
+            _pid, status, usage = os.wait4(process.pid, 0)
+            process.returncode = os.waitstatus_to_exitcode(status)
+
+        # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+        max_rss = usage.ru_maxrss if sys.platform == 'darwin' else usage.ru_maxrss * 1024
+
+        result = CheckerRun(
+            returncode=process.returncode,
+            stdout=stdout.result(),
+            stderr=stderr.result(),
+            cpu_time=usage.ru_utime + usage.ru_stime,
+            max_rss=max_rss,
+        )
+
+    if result.returncode:
+        print(subprocess.CalledProcessError(result.returncode, cmd), file=sys.stderr, flush=True)
+
+    return result
+
+
+def get_changed_paths(ref: str) -> set[str]:
+    """Return the absolute paths of files changed since the given git ref, including untracked files."""
+    commands = [
+        ['git', 'diff', '--name-only', '--no-renames', ref, '--'],
+        ['git', 'ls-files', '--others', '--exclude-standard'],
+    ]
+
+    changed = set()
+
+    for cmd in commands:
+        result = subprocess.run(cmd, cwd=ROOT, check=True, capture_output=True, text=True)
+        changed.update(os.path.normpath(ROOT / name) for name in result.stdout.splitlines())
+
+    return changed
+
+
+def find_affected_paths(paths: list[str], changed: set[str]) -> list[str]:
+    """Return the paths which are changed, or which directly or indirectly include a changed file."""
+    included_by: dict[str, set[str]] = {}
+
+    for path in paths:
+        with open(path, encoding='utf-8', errors='replace') as path_fd:
+            content = path_fd.read()
+
+        for match in INCLUDE_PATTERN.finditer(content):
+            target = match.group('target')
+
+            if target.startswith('/'):
+                target_path = os.path.join(SOURCE_DIR, target.lstrip('/'))
+            else:
+                target_path = os.path.join(os.path.dirname(path), target)
+
+            included_by.setdefault(os.path.normpath(target_path), set()).add(path)
+
+    affected: set[str] = set()
+    queue = list(changed)
+
+    while queue:
+        path = queue.pop()
+
+        if path in affected:
+            continue
+
+        affected.add(path)
+        queue.extend(included_by.get(path, ()))
+
+    return [path for path in paths if os.path.normpath(path) in affected]
+
+
+def shard_paths(paths: list[str], jobs: int) -> list[list[str]]:
+    """
+    Split paths into at most `jobs` shards of roughly equal total file size.
+
+    Checkers which do not take any paths always get a single (empty) shard.
+    """
+    jobs = min(jobs, len(paths))
+
+    if jobs <= 1:
+        return [paths]
+
+    # Largest files first, each going to the currently lightest shard.
+    sized = sorted(((os.path.getsize(path), path) for path in paths), key=lambda item: (-item[0], item[1]))
+    heap: list[tuple[int, int]] = [(0, index) for index in range(jobs)]
+    shards: list[list[str]] = [[] for _ in range(jobs)]
+
+    for size, path in sized:
+        total, index = heapq.heappop(heap)
+        shards[index].append(path)
+        heapq.heappush(heap, (total + size, index))
+
+    return [sorted(shard) for shard in shards]
+
+
+def parse_finding(line: str) -> dict:
+    """Parse a `path:line:col: message` output line, paths are made relative to the top of the repository where possible."""
+    match = FINDING_PATTERN.search(line)
+
+    if not match:
+        return dict(path=None, line=0, column=0, message=line)
+
+    path = os.path.abspath(match.group('path'))
+
+    if path.startswith(f'{ROOT}{os.path.sep}'):
+        path = os.path.relpath(path, ROOT)
+
+    return dict(path=path, line=int(match.group('line')), column=int(match.group('column')), message=match.group('message'))
+
+
+def write_report(filename: str, report_format: str, report: list[dict]) -> None:
+    """Write the checker results as plain JSON or as a SARIF log."""
+    if report_format == 'sarif':
+        data = dict(version='2.1.0', runs=[get_sarif_run(result) for result in report])
+        data = {'$schema': SARIF_SCHEMA, **data}
+    else:
+        data = dict(checkers=report)
+
+    with open(filename, 'w') as report_fd:
+        json.dump(data, report_fd, indent=4)
+        report_fd.write('\n')
+
+
+def get_sarif_run(result: dict) -> dict:
+    """Convert the results of a single checker to a SARIF run, keeping timings and resource usage as run properties."""
+    sarif_results = []
+
+    for finding in result['findings']:
+        sarif_result: dict = dict(ruleId=result['name'], level='error', message=dict(text=finding['message']))
+
+        if finding['path']:
+            location: dict = dict(artifactLocation=dict(uri=pathlib.Path(finding['path']).as_posix()))
+
+            if finding['line']:
+                location['region'] = dict(startLine=finding['line'])
+
+                if finding['column']:
+                    location['region']['startColumn'] = finding['column']
+
+            sarif_result['locations'] = [dict(physicalLocation=location)]
+
+        sarif_results.append(sarif_result)
+
+    properties = {key: result[key] for key in ('skipped', 'files', 'shards', 'wall_time', 'cpu_time', 'max_rss')}
+
+    return dict(
+        tool=dict(driver=dict(name=result['name'], informationUri='https://github.com/ansible/ansible-documentation')),
+        invocations=[dict(executionSuccessful=not any(result['exit_codes']))],
+        results=sarif_results,
+        properties=properties,
+    )
+
+
+def merge_output(outputs: collections.abc.Iterable[str]) -> str:
+    """Merge checker output from several shards, ordering `path:line:col: message` lines by location."""
+    lines = [line for output in outputs for line in output.splitlines()]
+
+    def sort_key(line: str) -> tuple[str, int, int, str]:
+        match = FINDING_PATTERN.search(line)
+
+        if not match:
+            return line, 0, 0, line
 
-    sys.stdout.write(result.stdout)
-    sys.stderr.write(result.stderr)
+        return match.group('path'), int(match.group('line')), int(match.group('column')), line
 
-    return bool(result.stdout or result.stderr)
+    return ''.join(f'{line}\n' for line in sorted(lines, key=sort_key))
 
 
 if __name__ == '__main__':
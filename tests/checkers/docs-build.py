@@ -1,14 +1,77 @@
 from __future__ import annotations
 
+import argparse
+import collections
+import hashlib
+import json
 import os
 import re
 import shutil
+import stat
 import subprocess
 import sys
 import tempfile
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Directories the build only reads from, files in these are hardlinked into the workspace when possible.
+READ_ONLY_DIRS = (
+    'bin',
+    'examples',
+    'hacking',
+    'lib',
+    'packaging',
+    'test/lib',
+)
+
+KNOWN_WARNINGS = {
+    'block-quote-missing-blank-line': r'^Block quote ends without a blank line; unexpected unindent.$',
+    'literal-block-lex-error': r'^Could not lex literal_block as "[^"]*". Highlighting skipped.$',
+    'duplicate-label': r'^duplicate label ',
+    'undefined-label': r'undefined label: ',
+    'unknown-document': r'unknown document: ',
+    'toc-tree-missing-document': r'toctree contains reference to nonexisting document ',
+    'reference-target-not-found': r'[^ ]* reference target not found: ',
+    'not-in-toc-tree': r"document isn't included in any toctree$",
+    'unexpected-indentation': r'^Unexpected indentation.$',
+    'definition-list-missing-blank-line': r'^Definition list ends without a blank line; unexpected unindent.$',
+    'explicit-markup-missing-blank-line': r'Explicit markup ends without a blank line; unexpected unindent.$',
+    'toc-tree-glob-pattern-no-match': r"^toctree glob pattern '[^']*' didn't match any documents$",
+    'unknown-interpreted-text-role': '^Unknown interpreted text role "[^"]*".$',
+}
+
+WARNING_PATTERN = re.compile('^(?P<path>[^:]+):((?P<line>[0-9]+):)?((?P<column>[0-9]+):)? (?P<level>WARNING|ERROR): (?P<message>.*)$')
+
+# From linux/fs.h, shares the data of one file with another on copy-on-write filesystems such as btrfs and xfs.
+FICLONE = 0x40049409
 
 
 def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--format', choices=('text', 'json'), default='text',
+                        help='report warnings one per line, or as JSON with the number of warnings per code (default: %(default)s)')
+    parser.add_argument('--baseline', metavar='FILE', default=os.environ.get('DOCS_BUILD_BASELINE'),
+                        help='only report warnings which are not in this baseline, and baseline warnings which no longer occur'
+                        ' (default: $DOCS_BUILD_BASELINE)')
+    parser.add_argument('--write-baseline', metavar='FILE',
+                        help='write all warnings of this build to a baseline file')
+
+    args = parser.parse_args()
+
+    workspace = os.environ.get('DOCS_BUILD_WORKSPACE')
+    incremental = bool(workspace and os.environ.get('DOCS_BUILD_INCREMENTAL'))
+
+    if incremental and (args.baseline or args.write_baseline):
+        # baseline warnings of documents which are not rebuilt would be reported as resolved
+        parser.error('--baseline and --write-baseline (or $DOCS_BUILD_BASELINE) need a full build, unset DOCS_BUILD_INCREMENTAL')
+
+    # resolve paths before changing to the workspace
+    args.baseline = args.baseline and os.path.abspath(args.baseline)
+    args.write_baseline = args.write_baseline and os.path.abspath(args.write_baseline)
     base_dir = os.getcwd()
 
     keep_dirs = [
@@ -29,32 +92,198 @@ def main():
 
     # The tests write to the source tree, which isn't permitted for sanity tests.
     # To work around this a temporary copy is used.
+    # When DOCS_BUILD_WORKSPACE is set, that directory is kept between runs instead, so staging and the generated rst
+    # are reused. Sphinx still reads every document again, since it only reports warnings for the documents it reads.
+    # Setting DOCS_BUILD_INCREMENTAL as well reuses the Sphinx environment too, and only documents affected by changed
+    # files get rebuilt. The warnings of all other documents are missing then, so such a run never passes.
 
-    current_dir = os.getcwd()
+    stager = Stager()
+
+    if workspace:
+        workspace = os.path.abspath(workspace)
+        sync_workspace(base_dir, workspace, keep_dirs, keep_files, stager)
+        stager.report()
+        use_workspace(base_dir, workspace)
+        run_test(args.format, args.baseline, args.write_baseline, incremental=incremental)
+
+        if incremental:
+            sys.stderr.write('Incremental build, only rebuilt documents were checked: unset DOCS_BUILD_INCREMENTAL for a full check\n')
+
+        return
 
     with tempfile.TemporaryDirectory(prefix='docs-build-', suffix='-sanity') as temp_dir:
+        start = time.perf_counter()
+
         for keep_dir in keep_dirs:
-            shutil.copytree(os.path.join(base_dir, keep_dir), os.path.join(temp_dir, keep_dir), symlinks=True)
+            shutil.copytree(os.path.join(base_dir, keep_dir), os.path.join(temp_dir, keep_dir), symlinks=True,
+                            copy_function=stager.get_copy_function(keep_dir))
 
         for keep_file in keep_files:
-            shutil.copy2(os.path.join(base_dir, keep_file), os.path.join(temp_dir, keep_file))
+            stager.copy(os.path.join(base_dir, keep_file), os.path.join(temp_dir, keep_file))
+
+        stager.elapsed += time.perf_counter() - start
+        stager.report()
+
+        use_workspace(base_dir, temp_dir)
+        run_test(args.format, args.baseline, args.write_baseline)
+
+
+class Stager:
+    """
+    Stage files into a workspace as cheaply as the filesystem allows.
+
+    Files are cloned with a reflink where supported and copied otherwise.
+    Files in READ_ONLY_DIRS are hardlinked instead, since the build never writes to them.
+    """
+
+    def __init__(self):
+        self.reflink_supported = fcntl is not None and sys.platform.startswith('linux')
+        self.hardlink_supported = True
+        self.counts = collections.Counter()
+        self.elapsed = 0.0
+
+    def get_copy_function(self, rel_path):
+        """Return the function to stage the given path, relative to the top of the tree, with."""
+        rel_path = rel_path.replace(os.path.sep, '/')
+
+        if any(rel_path == read_only or rel_path.startswith(f'{read_only}/') for read_only in READ_ONLY_DIRS):
+            return self.link
+
+        return self.copy
+
+    def link(self, src, dst):
+        """Hardlink a file into the workspace, falling back to copying it."""
+        if self.hardlink_supported:
+            try:
+                os.link(src, dst)
+            except OSError:
+                self.hardlink_supported = False  # most likely the workspace is on a different filesystem
+            else:
+                self.counts['hardlink'] += 1
+                return dst
+
+        return self.copy(src, dst)
+
+    def copy(self, src, dst):
+        """Copy a file into the workspace using a reflink if possible, preserving its metadata."""
+        if self.reflink_supported:
+            try:
+                with open(src, 'rb') as src_fd, open(dst, 'wb') as dst_fd:
+                    fcntl.ioctl(dst_fd.fileno(), FICLONE, src_fd.fileno())
+            except OSError:
+                self.reflink_supported = False
+            else:
+                shutil.copystat(src, dst)
+                self.counts['reflink'] += 1
+                return dst
+
+        shutil.copy2(src, dst)
+        self.counts['copy'] += 1
+        return dst
+
+    def report(self):
+        """Report how files were staged when DOCS_BUILD_STAGING_REPORT is set."""
+        # Any output from this checker is treated as a failure, so only report when asked for.
+        if not os.environ.get('DOCS_BUILD_STAGING_REPORT'):
+            return
+
+        counts = ', '.join('%s: %d' % (method, count) for method, count in sorted(self.counts.items())) or 'no changes'
+        sys.stderr.write('Staged workspace in %.2f seconds (%s)\n' % (self.elapsed, counts))
+
+
+def use_workspace(current_dir, workspace):
+    """Fix up the environment so everything runs from the workspace copy."""
+    paths = os.environ['PATH'].split(os.pathsep)
+    paths = [f'{workspace}/bin' if path == f'{current_dir}/bin' else path for path in paths]
+
+    os.environ['PATH'] = os.pathsep.join(paths)
+    os.environ['PYTHONPATH'] = f'{workspace}/lib'
+    os.chdir(workspace)
+
+
+def sync_workspace(base_dir, workspace, keep_dirs, keep_files, stager):
+    """
+    Bring a persistent workspace up to date with the source tree.
+
+    Only new or changed files are copied and timestamps are preserved, so Sphinx sees unchanged sources as up to date.
+    Files removed from the source tree since the last sync are removed from the workspace.
+    Anything else in the workspace, such as generated rst and the build directory, is left alone.
+    """
+    start = time.perf_counter()
+    manifest_path = os.path.join(workspace, '.docs-build-manifest.json')
+
+    try:
+        with open(manifest_path) as manifest_fd:
+            previous = set(json.load(manifest_fd))
+    except (OSError, ValueError):
+        previous = set()
+
+    current = set(keep_files)
+
+    for keep_dir in keep_dirs:
+        for root, dir_names, file_names in os.walk(os.path.join(base_dir, keep_dir)):
+            # symlinks to directories are not followed, they are copied as symlinks like copytree(symlinks=True) does
+            link_names = [name for name in dir_names if os.path.islink(os.path.join(root, name))]
+
+            for name in file_names + link_names:
+                current.add(os.path.relpath(os.path.join(root, name), base_dir))
+
+    for rel_path in sorted(current):
+        sync_file(os.path.join(base_dir, rel_path), os.path.join(workspace, rel_path), stager.get_copy_function(rel_path))
+
+    for rel_path in previous - current:
+        path = os.path.join(workspace, rel_path)
+
+        if os.path.lexists(path):
+            os.remove(path)
 
-        paths = os.environ['PATH'].split(os.pathsep)
-        paths = [f'{temp_dir}/bin' if path == f'{current_dir}/bin' else path for path in paths]
+    with open(manifest_path, 'w') as manifest_fd:
+        json.dump(sorted(current), manifest_fd)
 
-        # Fix up the environment so everything runs from the temporary copy.
-        os.environ['PATH'] = os.pathsep.join(paths)
-        os.environ['PYTHONPATH'] = f'{temp_dir}/lib'
-        os.chdir(temp_dir)
+    stager.elapsed += time.perf_counter() - start
 
-        run_test()
 
+def sync_file(src, dst, copy_function):
+    """Stage a file or symlink unless the destination already has the same size and modification time."""
+    try:
+        dst_stat = os.lstat(dst)
+    except FileNotFoundError:
+        dst_stat = None
 
-def run_test():
+    if os.path.islink(src):
+        link = os.readlink(src)
+
+        if dst_stat and stat.S_ISLNK(dst_stat.st_mode) and os.readlink(dst) == link:
+            return
+
+        if dst_stat:
+            os.remove(dst)
+
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        os.symlink(link, dst)
+        return
+
+    src_stat = os.stat(src)
+
+    if dst_stat:
+        if not stat.S_ISLNK(dst_stat.st_mode) and dst_stat.st_size == src_stat.st_size and dst_stat.st_mtime_ns == src_stat.st_mtime_ns:
+            return
+
+        # never write through a hardlink into the source tree
+        os.remove(dst)
+
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    copy_function(src, dst)
+
+
+def run_test(output_format='text', baseline=None, write_baseline=None, incremental=False):
     base_dir = os.getcwd() + os.path.sep
     docs_dir = os.path.abspath('docs/docsite')
 
     cmd = ['make', 'core_singlehtmldocs']
+
+    if not incremental:
+        cmd.append('O=-E')  # ignore a Sphinx environment left by an earlier run, so every document is read and warned about
     sphinx = subprocess.run(cmd, stdin=subprocess.DEVNULL, capture_output=True, cwd=docs_dir, check=False, text=True)
 
     stdout = sphinx.stdout
@@ -76,27 +305,57 @@ def run_test():
         sys.exit(1)
 
     with open('docs/docsite/rst_warnings', 'r') as warnings_fd:
-        output = warnings_fd.read().strip()
-        lines = output.splitlines()
-
-    known_warnings = {
-        'block-quote-missing-blank-line': r'^Block quote ends without a blank line; unexpected unindent.$',
-        'literal-block-lex-error': r'^Could not lex literal_block as "[^"]*". Highlighting skipped.$',
-        'duplicate-label': r'^duplicate label ',
-        'undefined-label': r'undefined label: ',
-        'unknown-document': r'unknown document: ',
-        'toc-tree-missing-document': r'toctree contains reference to nonexisting document ',
-        'reference-target-not-found': r'[^ ]* reference target not found: ',
-        'not-in-toc-tree': r"document isn't included in any toctree$",
-        'unexpected-indentation': r'^Unexpected indentation.$',
-        'definition-list-missing-blank-line': r'^Definition list ends without a blank line; unexpected unindent.$',
-        'explicit-markup-missing-blank-line': r'Explicit markup ends without a blank line; unexpected unindent.$',
-        'toc-tree-glob-pattern-no-match': r"^toctree glob pattern '[^']*' didn't match any documents$",
-        'unknown-interpreted-text-role': '^Unknown interpreted text role "[^"]*".$',
-    }
+        warnings = classify_warnings(warnings_fd, base_dir)
+        resolved = []
+
+        if baseline or write_baseline:
+            warnings = list(warnings)
+
+        if write_baseline:
+            save_baseline(write_baseline, warnings)
+
+        if baseline:
+            warnings, resolved = diff_baseline(warnings, load_baseline(baseline))
+
+        if output_format == 'json':
+            report_json(warnings, resolved if baseline else None)
+        else:
+            for path, lineno, column, code, message in warnings:
+                print('%s:%d:%d: %s: %s' % (path, lineno, column, code, message))
+
+            for path, code, message in resolved:
+                print('%s:%d:%d: %s: %s: %s' % (path, 0, 0, 'resolved', code, message))
 
+
+def compile_known_warnings(known_warnings):
+    """
+    Compile the known warning patterns into a single regex, returning it along with a map of group names to codes.
+
+    Each pattern may match anywhere in the message, like with re.search, and the first pattern that matches wins.
+    """
+    alternatives = []
+    codes = {}
+
+    for index, (code, pattern) in enumerate(known_warnings.items()):
+        group = f'code_{index}'
+        codes[group] = code
+        alternatives.append(f'(?:.*?(?P<{group}>{pattern}))')
+
+    return re.compile('|'.join(alternatives)), codes
+
+
+KNOWN_WARNINGS_PATTERN, KNOWN_WARNINGS_CODES = compile_known_warnings(KNOWN_WARNINGS)
+
+
+def classify_warnings(lines, base_dir):
+    """Classify Sphinx warning lines one at a time, yielding a (path, line, column, code, message) tuple for each."""
     for line in lines:
-        match = re.search('^(?P<path>[^:]+):((?P<line>[0-9]+):)?((?P<column>[0-9]+):)? (?P<level>WARNING|ERROR): (?P<message>.*)$', line)
+        line = line.rstrip('\n')
+
+        if not line.strip():
+            continue
+
+        match = WARNING_PATTERN.search(line)
 
         if not match:
             path = 'docs/docsite/rst/index.rst'
@@ -106,7 +365,7 @@ def run_test():
             message = line
 
             # surface unknown lines while filtering out known lines to avoid excessive output
-            print('%s:%d:%d: %s: %s' % (path, lineno, column, code, message))
+            yield path, lineno, column, code, message
             continue
 
         path = match.group('path')
@@ -125,15 +384,90 @@ def run_test():
 
         if level == 'warning':
             code = 'warning'
+            known = KNOWN_WARNINGS_PATTERN.match(message)
 
-            for label, pattern in known_warnings.items():
-                if re.search(pattern, message):
-                    code = label
-                    break
+            if known:
+                code = KNOWN_WARNINGS_CODES[known.lastgroup]
         else:
             code = 'error'
 
-        print('%s:%d:%d: %s: %s' % (path, lineno, column, code, message))
+        yield path, lineno, column, code, message
+
+
+def report_json(warnings, resolved=None):
+    """Write the classified warnings and the number of warnings per code as JSON, along with any resolved baseline warnings."""
+    items = []
+    counts = collections.Counter()
+
+    for path, lineno, column, code, message in warnings:
+        items.append(dict(path=path, line=lineno, column=column, code=code, message=message))
+        counts[code] += 1
+
+    report = dict(counts=dict(sorted(counts.items())), warnings=items)
+
+    if resolved is not None:
+        report['resolved'] = [dict(path=path, code=code, message=message) for path, code, message in resolved]
+
+    json.dump(report, sys.stdout, indent=4)
+    sys.stdout.write('\n')
+
+
+def get_fingerprint(path, code, message):
+    """Return a fingerprint for a warning which does not change when the line it is reported on moves."""
+    return hashlib.sha256(f'{path}\0{code}\0{message}'.encode()).hexdigest()
+
+
+def save_baseline(filename, warnings):
+    """Write the fingerprints of the given warnings to a baseline file."""
+    entries = {}
+
+    for path, lineno, column, code, message in warnings:
+        fingerprint = get_fingerprint(path, code, message)
+        entry = entries.setdefault(fingerprint, dict(path=path, code=code, message=message, count=0))
+        entry['count'] += 1
+
+    with open(filename, 'w') as baseline_fd:
+        json.dump(dict(version=1, warnings=entries), baseline_fd, indent=4, sort_keys=True)
+        baseline_fd.write('\n')
+
+
+def load_baseline(filename):
+    """Load a baseline file written by save_baseline, returning its entries by fingerprint."""
+    with open(filename) as baseline_fd:
+        baseline = json.load(baseline_fd)
+
+    if baseline.get('version') != 1:
+        raise Exception('Unsupported baseline version in "%s": %s' % (filename, baseline.get('version')))
+
+    return baseline['warnings']
+
+
+def diff_baseline(warnings, baseline):
+    """
+    Compare warnings against a baseline.
+
+    Returns the warnings which are not in the baseline, and a (path, code, message) tuple for each baseline warning which no longer occurs.
+    A warning reported more often than the baseline records counts as new for each extra occurrence.
+    """
+    remaining = collections.Counter({fingerprint: entry['count'] for fingerprint, entry in baseline.items()})
+    new = []
+
+    for warning in warnings:
+        path, lineno, column, code, message = warning
+        fingerprint = get_fingerprint(path, code, message)
+
+        if remaining[fingerprint] > 0:
+            remaining[fingerprint] -= 1
+        else:
+            new.append(warning)
+
+    resolved = []
+
+    for fingerprint, count in sorted(remaining.items(), key=lambda item: (baseline[item[0]]['path'], item[0])):
+        entry = baseline[fingerprint]
+        resolved.extend([(entry['path'], entry['code'], entry['message'])] * count)
+
+    return new, resolved
 
 
 def simplify_stdout(value):
@@ -1,26 +1,123 @@
 """Sanity test using rstcheck and sphinx."""
 from __future__ import annotations
 
+import argparse
+import functools
+import hashlib
+import importlib.metadata
+import json
+import os
+import pathlib
 import re
 import subprocess
 import sys
+import tempfile
+
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent.parent
+
+IGNORE_ROLES = (
+    'ansplugin',
+    'ansopt',
+    'ansretval',
+    'ansval',
+    'ansenvvar',
+    'ansenvvarref',
+)
+
+IGNORE_SUBSTITUTIONS = (
+    'br',
+)
+
+REPORT_LEVEL = 'warning'
+
+# Configuration files rstcheck looks for in the directory of each checked file and its parents, in this order.
+CONFIG_FILES = (
+    '.rstcheck.cfg',
+    'setup.cfg',
+)
+
+# Either `subprocess` to run the rstcheck CLI and parse its output, or `in-process` to use the rstcheck API directly.
+# The in-process engine checks one file at a time, while the rstcheck CLI checks files on all CPUs. It saves the
+# interpreter start-up on small runs, but is slower for full runs on multi-core machines.
+ENGINE = os.environ.get('RSTCHECK_ENGINE', 'subprocess')
+
+# Number of CPUs rstcheck may use, set by tests/checkers.py for sharded runs. rstcheck uses all of them by default.
+CPUS = os.environ.get('CHECKER_CPUS')
+
+# Runs with more files than this use the subprocess engine when more than one CPU is available, even with the in-process engine selected.
+IN_PROCESS_MAX_PATHS = 50
+
+# Set to an empty string to disable the result cache.
+CACHE_DIR = os.environ.get('RSTCHECK_CACHE_DIR', str(ROOT / '.cache' / 'rstcheck'))
 
 
 def main():
     paths = sys.argv[1:] or sys.stdin.read().splitlines()
 
+    cache_dir = get_cache_dir()
+
+    results_by_path = {}
+    pending = []
+
+    for path in paths:
+        cached = load_cached_results(cache_dir, path) if cache_dir else None
+
+        if cached is None:
+            pending.append(path)
+        else:
+            results_by_path[path] = cached
+
+    if pending:
+        results = check_paths(pending)
+        fresh = group_results(pending, results)
+
+        if fresh is None:
+            # Findings could not be attributed to the checked files, report them without caching.
+            for result in results:
+                print('%s:%s:%s: %s' % (result['path'], result['line'], 0, result['message']))
+        else:
+            for path, path_results in fresh.items():
+                results_by_path[path] = path_results
+
+                if cache_dir:
+                    store_cached_results(cache_dir, path, path_results)
+
+    for path in paths:
+        for result in results_by_path.get(path, []):
+            print('%s:%s:%s: %s' % (result['path'], result['line'], 0, result['message']))
+
+
+def check_paths(paths):
+    """Check the given paths with the configured engine and return the findings."""
+    if ENGINE == 'subprocess':
+        return check_paths_subprocess(paths)
+
+    if ENGINE == 'in-process':
+        if len(paths) > IN_PROCESS_MAX_PATHS and int(CPUS or os.cpu_count() or 1) > 1:
+            return check_paths_subprocess(paths)
+
+        return check_paths_in_process(paths)
+
+    raise Exception('Unknown RSTCHECK_ENGINE "%s", expected "subprocess" or "in-process"' % ENGINE)
+
+
+def check_paths_subprocess(paths):
+    """Run rstcheck on the given paths and return the parsed findings."""
     encoding = 'utf-8'
 
-    ignore_substitutions = (
-        'br',
-    )
+    if CPUS:
+        # rstcheck sizes its worker pool with multiprocessing.cpu_count() and has no option to change it.
+        code = 'import multiprocessing; multiprocessing.cpu_count = lambda: %d; import rstcheck; rstcheck.main();' % int(CPUS)
+    else:
+        code = 'import rstcheck; rstcheck.main();'
 
     cmd = [
         sys.executable,
-        '-c', 'import rstcheck; rstcheck.main();',
-        '--report', 'warning',
-        '--ignore-roles', 'ansplugin,ansopt,ansretval,ansval,ansenvvar,ansenvvarref',
-        '--ignore-substitutions', ','.join(ignore_substitutions),
+        '-c', code,
+        '--report', REPORT_LEVEL,
+        '--ignore-roles', ','.join(IGNORE_ROLES),
+        '--ignore-substitutions', ','.join(IGNORE_SUBSTITUTIONS),
     ] + paths
 
     process = subprocess.run(cmd,
@@ -35,10 +132,64 @@ def main():
 
     pattern = re.compile(r'^(?P<path>[^:]*):(?P<line>[0-9]+): \((?P<level>INFO|WARNING|ERROR|SEVERE)/[0-4]\) (?P<message>.*)$')
 
-    results = parse_to_list_of_dict(pattern, process.stderr.decode(encoding))
+    return parse_to_list_of_dict(pattern, process.stderr.decode(encoding))
 
-    for result in results:
-        print('%s:%s:%s: %s' % (result['path'], result['line'], 0, result['message']))
+
+def check_paths_in_process(paths):
+    """
+    Check the given paths with the rstcheck API in the current interpreter and return the findings.
+
+    This mirrors what the rstcheck CLI does for each file, without starting a new interpreter or parsing its output.
+    """
+    # The directory of this script is first on sys.path and this script would shadow the rstcheck package.
+    checkers_dir = os.path.dirname(os.path.abspath(__file__))
+    sys.path[:] = [path for path in sys.path if os.path.abspath(path or os.curdir) != checkers_dir]
+
+    import rstcheck  # pylint: disable=import-outside-toplevel
+
+    args = argparse.Namespace(
+        config=None,
+        debug=False,
+        report=REPORT_LEVEL,
+        ignore_language='',
+        ignore_messages='',
+        ignore_directives='',
+        ignore_roles=','.join(IGNORE_ROLES),
+        ignore_substitutions=','.join(IGNORE_SUBSTITUTIONS),
+    )
+
+    pattern = re.compile(r'^\((?P<level>INFO|WARNING|ERROR|SEVERE)/[0-4]\) (?P<message>.*)$', re.DOTALL)
+    results = []
+
+    with rstcheck.enable_sphinx_if_possible():
+        for path in paths:
+            path_args = rstcheck.load_configuration_from_file(os.path.dirname(os.path.realpath(path)), args)
+
+            rstcheck.ignore_directives_and_roles(path_args.ignore_directives, path_args.ignore_roles)
+
+            with open(path, encoding='utf-8') as path_fd:
+                source = path_fd.read()
+
+            for substitution in path_args.ignore_substitutions:
+                source = source.replace(f'|{substitution}|', 'None')
+
+            ignore = dict(
+                languages=path_args.ignore_language,
+                messages=path_args.ignore_messages,
+            )
+
+            for line, message in rstcheck.check(source, filename=path, report_level=path_args.report, ignore=ignore):
+                match = pattern.search(message)
+
+                results.append(dict(
+                    path=path,
+                    line=str(line),
+                    # messages without a docutils level prefix come from code block checkers and are reported as errors by the CLI
+                    level=match.group('level') if match else 'ERROR',
+                    message=match.group('message') if match else message,
+                ))
+
+    return results
 
 
 def parse_to_list_of_dict(pattern, value):
@@ -59,5 +210,110 @@ def parse_to_list_of_dict(pattern, value):
     return matched
 
 
+def group_results(paths, results):
+    """Group findings by the checked path they belong to, or return None if any of them cannot be attributed."""
+    grouped = {path: [] for path in paths}
+    lookup = {os.path.abspath(path): path for path in paths}
+
+    for result in results:
+        path = lookup.get(os.path.abspath(result['path']))
+
+        if path is None:
+            return None
+
+        grouped[path].append(result)
+
+    return grouped
+
+
+def get_cache_dir():
+    """
+    Return the result cache directory for the current rstcheck version and configuration.
+
+    Returns None when caching is disabled or rstcheck is not installed.
+    """
+    if not CACHE_DIR:
+        return None
+
+    versions = {}
+
+    for name in ('rstcheck', 'rstcheck-core', 'docutils', 'sphinx'):
+        try:
+            versions[name] = importlib.metadata.version(name)
+        except importlib.metadata.PackageNotFoundError:
+            versions[name] = None  # rstcheck-core only exists for rstcheck 6 and later, sphinx directives are optional
+
+    if not versions['rstcheck']:
+        return None
+
+    config = dict(
+        engine=ENGINE,
+        versions=versions,
+        report=REPORT_LEVEL,
+        ignore_roles=IGNORE_ROLES,
+        ignore_substitutions=IGNORE_SUBSTITUTIONS,
+    )
+
+    digest = hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()
+
+    return os.path.join(CACHE_DIR, digest[:16])
+
+
+@functools.lru_cache(maxsize=None)
+def get_config_digest(directory):
+    """Return a digest of the rstcheck configuration file used for files in the given directory, the same way rstcheck finds it."""
+    while True:
+        for name in CONFIG_FILES:
+            config_path = os.path.join(directory, name)
+
+            if os.path.exists(config_path):
+                with open(config_path, 'rb') as config_fd:
+                    return hashlib.sha256(config_path.encode() + b'\0' + config_fd.read()).hexdigest()
+
+        parent = os.path.dirname(directory)
+
+        if parent == directory:
+            return ''
+
+        directory = parent
+
+
+def get_cache_path(cache_dir, path):
+    """
+    Return the cache entry path for the current content of the given file and the configuration file which applies to it.
+
+    Files pulled in with ``include::`` are not part of the key, so a change to an included file alone is not detected.
+    """
+    digest = hashlib.sha256()
+    digest.update(os.path.abspath(path).encode())
+    digest.update(b'\0')
+    digest.update(get_config_digest(os.path.dirname(os.path.realpath(path))).encode())
+    digest.update(b'\0')
+
+    with open(path, 'rb') as path_fd:
+        digest.update(path_fd.read())
+
+    return os.path.join(cache_dir, f'{digest.hexdigest()}.json')
+
+
+def load_cached_results(cache_dir, path):
+    """Return the cached findings for the given file, or None if there are none for its current content."""
+    try:
+        with open(get_cache_path(cache_dir, path)) as cache_fd:
+            return json.load(cache_fd)
+    except (OSError, ValueError):
+        return None
+
+
+def store_cached_results(cache_dir, path, results):
+    """Store the findings for the given file, replacing the entry atomically so parallel checker runs can share the cache."""
+    os.makedirs(cache_dir, exist_ok=True)
+
+    with tempfile.NamedTemporaryFile('w', dir=cache_dir, suffix='.tmp', delete=False) as cache_fd:
+        json.dump(results, cache_fd)
+
+    os.replace(cache_fd.name, get_cache_path(cache_dir, path))
+
+
 if __name__ == '__main__':
     main()